@@ -0,0 +1,102 @@
+"""
+Benchmark - Optimization Dispatch Solvers
+최적화 배차 솔버 벤치마크
+
+Checks that min_cost_flow_dispatch reaches the same objective as the SCIP MIP
+(ortools_dispatch) on random rectangular cost matrices, then times both
+solvers on straight-line passenger × vehicle matrices. Exits with status 1
+if any objective differs by more than the min-cost flow's integer rounding.
+무작위 직사각형 비용 행렬에서 두 솔버의 목적함수 값이 같은지 확인한 뒤
+수행 시간을 비교합니다.
+
+Run from the repository root:  python benchmarks/assignment_solvers.py [--check-only]
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dispatch.dispatch_algorithms import ortools_dispatch, min_cost_flow_dispatch
+from modules.utils.distance_utils import haversine_matrix
+
+# =========== CONFIGURATION ===========
+
+CHECK_CASES = 200    # 목적함수 비교에 사용할 무작위 행렬 수
+CHECK_MAX_SIZE = 40  # 무작위 행렬의 최대 행/열 수
+TIMING_SIZES = [(10, 30), (50, 50), (100, 40), (60, 200), (200, 200), (300, 300), (1000, 800)]
+MIP_MAX_CELLS = 90_000  # 이보다 큰 행렬은 MIP 시간 측정 생략
+SEED = 0
+
+
+# Cost matrix of a random dispatch tick in the layout both solvers take (larger set first).
+# Alternates uniform costs, integer costs (many equal-cost ties) and straight-line distances.
+def random_case(rng, case):
+    passenger_cnt, vehicle_cnt = rng.integers(1, CHECK_MAX_SIZE + 1, size=2)
+    shape = (max(passenger_cnt, vehicle_cnt), min(passenger_cnt, vehicle_cnt))
+    if case % 3 == 0:
+        cost_matrix = rng.uniform(0, 10, shape)
+    elif case % 3 == 1:
+        cost_matrix = rng.integers(0, 5, shape).astype(np.float64)
+    else:
+        cost_matrix = haversine_matrix(random_points(rng, shape[0]), random_points(rng, shape[1]))
+    return range(passenger_cnt), range(vehicle_cnt), cost_matrix
+
+
+# Random [lat, lon] points over Seongnam
+def random_points(rng, n):
+    return np.c_[rng.uniform(37.35, 37.48, n), rng.uniform(127.05, 127.18, n)]
+
+
+# Compare objectives on CHECK_CASES random matrices; returns the number of mismatches
+def check_objectives():
+    rng = np.random.default_rng(SEED)
+    mismatches = 0
+    for case in range(CHECK_CASES):
+        passengers, vehicles, cost_matrix = random_case(rng, case)
+        mip = ortools_dispatch(passengers, vehicles, cost_matrix)
+        mcf = min_cost_flow_dispatch(passengers, vehicles, cost_matrix)
+
+        # Each of the min(P, V) matched costs is rounded to 1e-6 in the flow
+        tolerance = 1e-6 * cost_matrix.shape[1] + 1e-9 * abs(sum(mip['distance']))
+        if (len(mip['distance']) != len(mcf['distance'])
+                or abs(sum(mip['distance']) - sum(mcf['distance'])) > tolerance):
+            mismatches += 1
+            print(f"- case {case} ({len(passengers)}x{len(vehicles)}): "
+                  f"MIP {sum(mip['distance']):.6f} vs min-cost flow {sum(mcf['distance']):.6f}")
+
+    print(f"- Objective check: {CHECK_CASES - mismatches}/{CHECK_CASES} random matrices equal")
+    return mismatches
+
+
+# Solve time of both solvers on straight-line matrices of TIMING_SIZES
+def time_solvers():
+    rng = np.random.default_rng(SEED)
+    print(f"{'P x V':>10}  {'MIP (s)':>9}  {'MCF (s)':>9}  {'same objective':>14}")
+    for passenger_cnt, vehicle_cnt in TIMING_SIZES:
+        P, V = random_points(rng, passenger_cnt), random_points(rng, vehicle_cnt)
+        cost_matrix = haversine_matrix(P, V) if passenger_cnt >= vehicle_cnt else haversine_matrix(V, P)
+        passengers, vehicles = range(passenger_cnt), range(vehicle_cnt)
+
+        start = time.perf_counter()
+        mcf = min_cost_flow_dispatch(passengers, vehicles, cost_matrix)
+        mcf_secs = time.perf_counter() - start
+
+        if passenger_cnt * vehicle_cnt <= MIP_MAX_CELLS:
+            start = time.perf_counter()
+            mip = ortools_dispatch(passengers, vehicles, cost_matrix)
+            mip_secs = f"{time.perf_counter() - start:.4f}"
+            same = str(abs(sum(mip['distance']) - sum(mcf['distance'])) <= 1e-6 * min(cost_matrix.shape))
+        else:
+            mip_secs, same = '-', '-'
+
+        print(f"{f'{passenger_cnt}x{vehicle_cnt}':>10}  {mip_secs:>9}  {mcf_secs:>9.4f}  {same:>14}")
+
+
+if __name__ == '__main__':
+    mismatches = check_objectives()
+    if '--check-only' not in sys.argv:
+        time_solvers()
+    sys.exit(1 if mismatches else 0)
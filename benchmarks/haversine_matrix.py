@@ -0,0 +1,72 @@
+"""
+Benchmark - Straight-line Cost Matrices
+직선거리 비용 행렬 벤치마크
+
+Times haversine cost matrices from 100×100 to 5000×5000: the previous per-row
+loop of calculate_straight_distance calls (small sizes only), and
+haversine_matrix in float64 and float32. Also reports how far the float64
+matrix is from elementwise calculate_straight_distance and the largest
+float32 error.
+이전 행 단위 반복 계산과 haversine_matrix (float64 / float32)의 수행 시간 및
+오차를 비교합니다.
+
+Run from the repository root:  python benchmarks/haversine_matrix.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils.distance_utils import calculate_straight_distance, haversine_matrix
+
+# =========== CONFIGURATION ===========
+
+SIZES = [100, 500, 1000, 2000, 5000]  # N×N 행렬 크기
+LOOP_MAX_SIZE = 500                   # 이전 반복 계산은 이 크기까지만 측정
+EXACT_MAX_SIZE = 2000                 # 원소별 비교는 이 크기까지만 수행 (메모리)
+SEED = 0
+
+
+# Previous cost matrix: one calculate_straight_distance call per cell, row by row
+def loop_matrix(A, B):
+    costs = []
+    for a in A:
+        costs.append(list(map(lambda data: calculate_straight_distance(data[0], data[1], a[0], a[1]).tolist(), B)))
+    return np.array(costs)
+
+
+# Random [lat, lon] points over Seongnam
+def random_points(rng, n):
+    return np.c_[rng.uniform(37.3, 37.5, n), rng.uniform(127.0, 127.2, n)]
+
+
+# Seconds taken by fn(*args) and its result
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(SEED)
+    print(f"{'N x N':>11}  {'loop (s)':>9}  {'float64 (s)':>11}  {'float32 (s)':>11}  "
+          f"{'f64 vs elementwise (km)':>23}  {'f32 max error (m)':>17}")
+    for n in SIZES:
+        A, B = random_points(rng, n), random_points(rng, n)
+        loop_secs = f"{timed(loop_matrix, A.tolist(), B.tolist())[0]:.3f}" if n <= LOOP_MAX_SIZE else '-'
+        f64_secs, matrix = timed(haversine_matrix, A, B)
+        f32_secs, matrix32 = timed(haversine_matrix, A, B, np.float32)
+
+        if n <= EXACT_MAX_SIZE:
+            rows, cols = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+            exact = calculate_straight_distance(A[rows, 0], A[rows, 1], B[cols, 0], B[cols, 1])
+            exact_diff = f"{np.abs(exact - matrix).max():.1e}"
+        else:
+            exact_diff = '-'
+        f32_error = np.abs(matrix32 - matrix).max() * 1000
+
+        print(f"{f'{n}x{n}':>11}  {loop_secs:>9}  {f64_secs:>11.4f}  {f32_secs:>11.4f}  "
+              f"{exact_diff:>23}  {f32_error:>17.2f}")
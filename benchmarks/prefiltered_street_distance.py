@@ -0,0 +1,115 @@
+"""
+Benchmark - Prefiltered Street Distance Matrices
+사전 필터링 도로거리 행렬 벤치마크
+
+Builds optimization cost matrices for random passenger × vehicle ticks with
+street_distance, haversine_distance and prefiltered_street_distance (both
+street_matrix_backend values), counts the router requests and routed cells
+each one sends, and scores its min-cost-flow matching on the true road
+distances. The router is synthetic: an in-process OSRM client whose road
+distance is the straight line times a fixed 1.1-1.9 detour per pair, with
+the default 100-location table limit.
+합성 라우터로 매트릭스 모드별 라우터 요청 수와 배차 결과의 실제 도로거리를
+비교합니다.
+
+Run from the repository root:  python benchmarks/prefiltered_street_distance.py
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dispatch.cost_matrix import dispatch_cost_matrix
+from modules.dispatch.dispatch_algorithms import min_cost_flow_dispatch
+from modules.routing.osrm_client import OSRMClient, set_osrm_client
+from modules.utils.distance_utils import haversine_matrix
+
+# =========== CONFIGURATION ===========
+
+TICKS = [(20, 60), (60, 60), (100, 40), (200, 200)]  # (승객 수, 빈 차량 수)
+MODES = [
+    ('street_distance', {}),
+    ('haversine_distance', {}),
+    ('prefiltered_street_distance', {'prefilter_k': 3}),
+    ('prefiltered_street_distance', {'prefilter_k': 5}),
+    ('prefiltered_street_distance', {'prefilter_k': 10})
+]
+BACKENDS = ['route', 'table']
+SEED = 0
+
+
+# Response of the synthetic router
+class SyntheticResponse:
+
+    def __init__(self, payload):
+        self.status_code = 200
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+# OSRM client answering route and table requests in process; counts requests and routed cells
+class SyntheticOSRM(OSRMClient):
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+        self.cells = 0
+
+    def get(self, service, coordinates, params=None):
+        points = np.array([[float(v) for v in loc.split(',')[::-1]] for loc in coordinates.split(';')])
+        self.requests += 1
+        if service == 'route':
+            self.cells += 1
+            distance = road_distance(points[:1], points[1:])[0, 0]
+            return SyntheticResponse({'code': 'Ok', 'routes': [{'distance': distance, 'duration': distance / 500}]})
+
+        sources = points[[int(i) for i in params['sources'].split(';')]]
+        destinations = points[[int(i) for i in params['destinations'].split(';')]]
+        self.cells += len(sources) * len(destinations)
+        distance = road_distance(sources, destinations)
+        return SyntheticResponse({'code': 'Ok', 'distances': distance.tolist(), 'durations': (distance / 500 * 60).tolist()})
+
+
+# Road distance (m): straight line times a detour factor in [1.1, 1.9) fixed for each pair
+def road_distance(A, B):
+    detour = np.array([[1.1 + 0.8 * (hash(tuple(np.round(np.r_[a, b], 6))) % 1000) / 1000 for b in B] for a in A])
+    return haversine_matrix(A, B) * 1000 * detour
+
+
+# Random [lat, lon] points over Seongnam
+def random_points(rng, n):
+    return np.c_[rng.uniform(37.38, 37.48, n), rng.uniform(127.05, 127.17, n)]
+
+
+if __name__ == '__main__':
+    router = set_osrm_client(SyntheticOSRM())
+    rng = np.random.default_rng(SEED)
+    rows = []
+    for passenger_cnt, vehicle_cnt in TICKS:
+        P, V = random_points(rng, passenger_cnt), random_points(rng, vehicle_cnt)
+        passengers = pd.DataFrame({'ride_lat': P[:, 0], 'ride_lon': P[:, 1]})
+        vehicles = pd.DataFrame({'lat': V[:, 0], 'lon': V[:, 1]})
+        truth = road_distance(P, V) / 1000
+
+        for matrix_mode, extra in MODES:
+            for backend in BACKENDS if matrix_mode != 'haversine_distance' else ['-']:
+                configs = {'matrix_mode': matrix_mode, 'dispatch_mode': 'optimization', 'street_matrix_backend': backend,
+                           'routing_workers': 1, 'metrics_only': True, **extra}
+                router.requests = router.cells = 0
+                cost_matrix = dispatch_cost_matrix(passengers, vehicles, 0, configs)
+                matched = min_cost_flow_dispatch(passengers, vehicles, cost_matrix)
+                rows.append({
+                    'tick': f'{passenger_cnt}x{vehicle_cnt}',
+                    'mode': matrix_mode + (f" k={extra['prefilter_k']}" if 'prefilter_k' in extra else ''),
+                    'backend': backend,
+                    'requests': router.requests,
+                    'routed cells': router.cells,
+                    'matched road km': round(truth[matched['passenger'], matched['vehicle']].sum(), 2)
+                })
+
+    print(pd.DataFrame(rows).to_string(index=False))
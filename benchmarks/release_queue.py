@@ -0,0 +1,71 @@
+"""
+Benchmark - Per-tick Passenger Release
+틱별 승객 요청 릴리스 벤치마크
+
+Times releasing one minute's passenger requests on a synthetic day, comparing
+the previous boolean scan over the pending DataFrame with ReleaseQueue
+(sorted once, cohorts released by binary search). The ReleaseQueue cost
+should stay flat as the total daily demand grows.
+하루 전체 수요가 커져도 ReleaseQueue의 틱별 비용은 일정해야 합니다.
+
+Run from the repository root:  python benchmarks/release_queue.py
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.engine.agent_store import ReleaseQueue
+
+# =========== CONFIGURATION ===========
+
+DEMANDS = [10_000, 100_000, 1_000_000]  # 하루 전체 승객 요청 수
+TICKS = range(600, 660)                 # 측정할 시뮬레이션 분 (10:00 ~ 11:00)
+SEED = 0
+
+
+# Passenger requests spread uniformly over one day
+def synthetic_passengers(n, seed=SEED):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ID': np.arange(n),
+        'ride_time': np.sort(rng.integers(0, 1440, n)),
+        'ride_lat': 0.0, 'ride_lon': 0.0, 'alight_lat': 0.0, 'alight_lon': 0.0,
+        'dispatch_time': 0, 'type': 0
+    })
+
+
+# Previous release: scan the remaining pending rows twice per tick
+def scan_release(pending, time):
+    released = pending[pending['ride_time'] == time]
+    pending = pending[pending['ride_time'] != time].reset_index(drop=True)
+    return released, pending
+
+
+# Median seconds per tick of both release paths over TICKS
+def time_release(passengers):
+    pending, scan_times = passengers, []
+    for tick in TICKS:
+        start = time.perf_counter()
+        _, pending = scan_release(pending, tick)
+        scan_times.append(time.perf_counter() - start)
+
+    queue, queue_times = ReleaseQueue(passengers, 'ride_time'), []
+    queue.release(TICKS[0] - 1)
+    for tick in TICKS:
+        start = time.perf_counter()
+        queue.release(tick)
+        queue_times.append(time.perf_counter() - start)
+
+    return np.median(scan_times), np.median(queue_times)
+
+
+if __name__ == '__main__':
+    print(f"{'demand':>10}  {'scan (ms)':>10}  {'queue (ms)':>10}")
+    for n in DEMANDS:
+        scan_secs, queue_secs = time_release(synthetic_passengers(n))
+        print(f"{n:>10,d}  {scan_secs * 1e3:>10.3f}  {queue_secs * 1e3:>10.3f}")
@@ -26,6 +26,7 @@ warnings.filterwarnings('ignore')
 
 from modules.engine.simulator import Simulator
 from modules.engine.config_manager import base_configs
+from modules.engine.io_manager import load_result_table
 from modules.preprocess.passenger_preprocessor import preprocess_passengers
 from modules.preprocess.vehicle_preprocessor import preprocess_vehicles
 from modules.preprocess.data_preprocessor import get_preprocessed_data
@@ -109,8 +110,8 @@ simulator.run()
 
 save_path = simul_configs['save_path']
 
-passengers_j = pd.read_json(os.path.join(save_path, 'passenger_marker.json'))
-trip_j       = pd.read_json(os.path.join(save_path, 'trip.json'))
+passengers_j = load_result_table(save_path, 'passenger_marker', columns=['start_time', 'end_time'])
+trip_j       = load_result_table(save_path, 'trip', columns=['vehicle_id', 'board', 'start_time', 'end_time'])
 records_csv  = pd.read_csv(os.path.join(save_path, 'record.csv'))
 
 result = generate_simulation_result_json(passengers_j, trip_j, records_csv,time_range=simul_configs['time_range'])
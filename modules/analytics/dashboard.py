@@ -6,6 +6,7 @@ import geopandas as gpd
 import osmnx as ox
 import shutil
 from modules.engine.config_manager import base_configs
+from modules.engine.io_manager import load_result_table
 from .service_charts import figure_1, figure_2, figure_3
 from .fleet_charts import figure_4, figure_5
 from .spatial_charts import figure_6_7_N_8_9, figure_10, figure_11
@@ -89,7 +90,7 @@ def simulation_configuration_for_dashboard(base_path, save_path, simulation_name
                             fd.startswith("simulation_")]
     
     for fd_nm in folders_to_process: 
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['passenger_id'])
         passenger_number = len(set(passengers['passenger_id']))
         simul_result_inf['total_calls'].append(passenger_number)
         
@@ -100,9 +101,9 @@ def simulation_configuration_for_dashboard(base_path, save_path, simulation_name
         simul_result_inf['failed_calls'].append(failed_calls_num)
         simul_result_inf['failure_rate'].append(failure_rate)
         
-        vehicles = pd.read_json(base_path + fd_nm + '/vehicle_marker.json')
+        vehicles = load_result_table(base_path + fd_nm, 'vehicle_marker', columns=['vehicle_id'])
         vehicle_id_1 = set(vehicles['vehicle_id'])
-        trips = pd.read_json(base_path + fd_nm + '/trip.json')
+        trips = load_result_table(base_path + fd_nm, 'trip', columns=['vehicle_id'])
         vehicle_id_2 = set(trips['vehicle_id'])
         vehicle_driven_num = len(vehicle_id_1 & vehicle_id_2)
         simul_result_inf['vehicles_driven'].append(vehicle_driven_num)
@@ -124,11 +125,12 @@ def simulation_configuration_for_dashboard(base_path, save_path, simulation_name
 
 
 # Generate detailed simulation result JSON
+# (start_time/end_time are taken from the timestamps unless already loaded)
 def generate_simulation_result_json(passengers, trip, records, time_range=[0, 1440]):
-    trip['start_time'] = [ts[0] for ts in trip['timestamp']]
-    trip['end_time'] = [ts[-1] for ts in trip['timestamp']]
-    passengers['start_time'] = [ts[0] for ts in passengers['timestamp']]
-    passengers['end_time'] = [ts[-1] for ts in passengers['timestamp']]
+    for data in (trip, passengers):
+        if 'start_time' not in data.columns:
+            data['start_time'] = [ts[0] for ts in data['timestamp']]
+            data['end_time'] = [ts[-1] for ts in data['timestamp']]
 
     # Initialize result lists
     driving_vehicle_num_lst = []
@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.graph_objects as go 
 from plotly.subplots import make_subplots
 import plotly.io as pio
+from modules.engine.io_manager import load_result_table
 
 pio.renderers.default = "iframe"
 
@@ -25,9 +26,7 @@ def figure_1(base_path, time_range, time_bins, time_single_labels, simulation_na
 
     # Process each simulation folder
     for fd_nm in folders_to_process:
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
-        passengers['start_time'] = [tm[0] for tm in passengers['timestamp']]
-        passengers['end_time'] = [tm[-1] for tm in passengers['timestamp']]
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['status', 'start_time', 'end_time'])
         passengers['time_cat'] = pd.cut(passengers['start_time'], bins=time_bins, labels=time_single_labels, right=False)
 
         # Process failure passengers based on failure time
@@ -109,9 +108,7 @@ def figure_2(base_path, time_bins, time_single_labels, time_double_labels, simul
 
     # Process each simulation folder
     for fd_nm in folders_to_process:
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
-        passengers['start_time'] = [tm[0] for tm in passengers['timestamp']]
-        passengers['end_time'] = [tm[-1] for tm in passengers['timestamp']]
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['status', 'start_time', 'end_time'])
         passengers['waiting_time'] = passengers['end_time'] - passengers['start_time']
         passengers['time_cat'] = pd.cut(passengers['start_time'], bins=time_bins, labels=time_single_labels, right=False) 
         
@@ -243,9 +240,7 @@ def figure_3(base_path, time_range, time_bins, time_single_labels, simulation_na
     
     # Process each simulation folder
     for fd_nm in folders_to_process:
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
-        passengers['start_time'] = [tm[0] for tm in passengers['timestamp']]
-        passengers['end_time'] = [tm[-1] for tm in passengers['timestamp']]
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['status', 'start_time', 'end_time'])
         passengers['waiting_time'] = passengers['end_time'] - passengers['start_time']
         passengers['time_cat'] = pd.cut(passengers['start_time'], bins=time_bins, labels=time_single_labels, right=False) 
         waiting_time_inf = passengers[['time_cat', 'waiting_time']]
@@ -5,6 +5,7 @@ from shapely.geometry import Point
 import plotly.graph_objects as go 
 import plotly.express as px
 import plotly.io as pio
+from modules.engine.io_manager import load_result_table
 
 pio.renderers.default = "iframe"
 
@@ -22,19 +23,16 @@ def figure_6_7_N_8_9(base_path, place_geometry, mapboxKey, time_range, status='p
 
     total_trips = []
     for fd_nm in folders_to_process:
-        trips = pd.read_json(base_path + fd_nm + '/trip.json')
-        
+        # Only the route endpoints and first/last timestamps are needed, not the full geometry
         if status == 'pickup':
+            trips = load_result_table(base_path + fd_nm, 'trip', columns=['board', 'start_lon', 'start_lat', 'start_time'])
             pickup_trips = trips.loc[(trips['board'] == 0)].reset_index(drop=True)
-            pickup_trips['lon'] = [tp[0][0] for tp in pickup_trips['trip']]
-            pickup_trips['lat'] = [tp[0][1] for tp in pickup_trips['trip']]
-            pickup_trips['time'] = [ts[0] for ts in pickup_trips['timestamp']]
+            pickup_trips = pickup_trips.rename(columns={'start_lon': 'lon', 'start_lat': 'lat', 'start_time': 'time'})
             total_trips.append(pickup_trips)
         else:
+            trips = load_result_table(base_path + fd_nm, 'trip', columns=['board', 'end_lon', 'end_lat', 'end_time'])
             dropoff_trips = trips.loc[(trips['board'] == 1)].reset_index(drop=True)
-            dropoff_trips['lon'] = [tp[-1][0] for tp in dropoff_trips['trip']]
-            dropoff_trips['lat'] = [tp[-1][1] for tp in dropoff_trips['trip']]
-            dropoff_trips['time'] = [ts[-1] for ts in dropoff_trips['timestamp']]
+            dropoff_trips = dropoff_trips.rename(columns={'end_lon': 'lon', 'end_lat': 'lat', 'end_time': 'time'})
             total_trips.append(dropoff_trips)
         
     total_trips = pd.concat(total_trips).reset_index(drop=True)
@@ -147,10 +145,10 @@ def figure_10(base_path, place_geometry, region_boundary, mapboxKey, simulation_
 
     total_failure_ps = []
     for fd_nm in folders_to_process:
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['status', 'lon', 'lat'])
         failure_passengers = passengers.loc[(passengers['status'] == 0)].reset_index(drop=True)
         
-        failure_passengers['geometry'] = [Point(geo) for geo in failure_passengers['location']]
+        failure_passengers['geometry'] = [Point(lon, lat) for lon, lat in zip(failure_passengers['lon'], failure_passengers['lat'])]
         failure_passengers = gpd.GeoDataFrame(failure_passengers[['geometry']], geometry='geometry', crs=4326)
         failure_passengers = gpd.sjoin(failure_passengers, region_boundary)
         total_failure_ps.append(failure_passengers)
@@ -199,10 +197,10 @@ def figure_11(base_path, place_geometry, region_boundary, mapboxKey, simulation_
 
     total_waiting_time_by_region = []
     for fd_nm in folders_to_process:
-        passengers = pd.read_json(base_path + fd_nm + '/passenger_marker.json')
-        passengers['waiting_time'] = [tm[-1]-tm[0] for tm in passengers['timestamp']]
+        passengers = load_result_table(base_path + fd_nm, 'passenger_marker', columns=['start_time', 'end_time', 'lon', 'lat'])
+        passengers['waiting_time'] = passengers['end_time'] - passengers['start_time']
         
-        passengers['geometry'] = [Point(geo) for geo in passengers['location']]
+        passengers['geometry'] = [Point(lon, lat) for lon, lat in zip(passengers['lon'], passengers['lat'])]
         passengers = gpd.GeoDataFrame(passengers[['waiting_time', 'geometry']], geometry='geometry', crs=4326)
         passengers = gpd.sjoin(passengers, region_boundary)
         
@@ -2,8 +2,11 @@ import numpy as np
 import pandas as pd 
 from multiprocess import Pool
 
-from modules.routing.osrm_client import osrm_routing_machine
-from modules.utils.distance_utils import calculate_straight_distance
+from modules.routing.osrm_client import osrm_routing_machine, osrm_table, route_many
+from modules.utils.distance_utils import calculate_straight_distance, haversine_matrix
+from modules.utils.spatial_index import HaversineGridIndex
+from modules.dispatch.eta_inference import ETAPredictor
+from modules.routing.detour_model import DetourModel
 
 
 # Prepare passenger and vehicle data for cost matrix calculation
@@ -12,84 +15,112 @@ def cost_matrix_data_prepare(passenger, vehicle, simul_configs):
         # ETA mode uses full dataframes
         pass
     else:
-        # Extract coordinates for distance calculations
-        passenger = passenger[['ride_lat', 'ride_lon']].values.tolist()
-        vehicle = vehicle[['lat', 'lon']].values.tolist()
+        # Extract coordinates for distance calculations ([[lat, lon], ...] arrays)
+        passenger = passenger[['ride_lat', 'ride_lon']].to_numpy(dtype=np.float64)
+        vehicle = vehicle[['lat', 'lon']].to_numpy(dtype=np.float64)
     return passenger, vehicle
 
 
-# Calculate ETA-based cost matrix
+# Road distance matrix (km) from every point of A to every point of B ([[lat, lon], ...]).
+# The 'table' backend asks OSRM's table service for whole blocks at once; 'route' requests
+# one route per pair. Cells that could not be routed fall back to the straight-line distance.
+def street_distance_matrix(A, B, simul_configs):
+    if simul_configs.get('street_matrix_backend', 'table') == 'route':
+        costs = [list(a) + list(b) for a in A for b in B]
+        routed = route_many(costs, simul_configs.get('routing_workers', 8),
+                            geometry=not simul_configs.get('metrics_only', False))
+        distance = np.array([rs['distance'] if rs is not None else np.nan for rs in routed])
+        cost_matrix = distance.reshape(len(A), len(B)) / 1000  # Convert to km
+    else:
+        distance, _ = osrm_table(A, B)
+        cost_matrix = distance / 1000  # Convert to km
+
+    missing = np.isnan(cost_matrix)
+    if missing.any():
+        src, dst = np.nonzero(missing)
+        A, B = np.asarray(A, dtype=np.float64), np.asarray(B, dtype=np.float64)
+        cost_matrix[missing] = calculate_straight_distance(A[src, 0], A[src, 1], B[dst, 0], B[dst, 1])
+    return cost_matrix
+
+
+# Cost of the cells prefiltered_street_distance_matrix leaves unrouted with prefilter_fill='sentinel'
+PREFILTER_SENTINEL = 1000.0
+
+
+# Road distance matrix (km) from A to B routed only where it can matter. Straight-line distances
+# pick the `prefilter_k` nearest points of B for every point of A and only those pairs are routed;
+# the other cells get the straight-line distance times the road/straight ratio measured on the
+# routed pairs ('estimate') or PREFILTER_SENTINEL ('sentinel').
+def prefiltered_street_distance_matrix(A, B, simul_configs):
+    A, B = np.asarray(A, dtype=np.float64), np.asarray(B, dtype=np.float64)
+    straight = haversine_matrix(A, B, simul_configs.get('haversine_dtype', 'float64')).astype(np.float64)
+    k = min(simul_configs.get('prefilter_k', 5), len(B))
+    if len(A) == 0 or k == 0:
+        return straight
+
+    # Stage 1: nearest candidates of every row, and of every column, by straight-line distance
+    candidate = np.zeros(straight.shape, dtype=bool)
+    np.put_along_axis(candidate, np.argpartition(straight, k - 1, axis=1)[:, :k], True, axis=1)
+    k_col = min(k, len(A))
+    np.put_along_axis(candidate, np.argpartition(straight, k_col - 1, axis=0)[:k_col], True, axis=0)
+    rows, cols = np.nonzero(candidate)
+
+    # Stage 2: road distances for the candidate pairs only
+    if simul_configs.get('street_matrix_backend', 'table') == 'route':
+        pairs = np.hstack([A[rows], B[cols]]).tolist()
+        routed = route_many(pairs, simul_configs.get('routing_workers', 8),
+                            geometry=not simul_configs.get('metrics_only', False))
+        road = np.array([rs['distance'] if rs is not None else np.nan for rs in routed]) / 1000  # Convert to km
+    else:
+        # One (blocked) table lookup from the rows to every candidate column
+        targets = np.unique(cols)
+        distance, _ = osrm_table(A, B[targets])
+        road = distance[rows, np.searchsorted(targets, cols)] / 1000
+
+    ratio = detour_ratio(road, straight[rows, cols])
+    if simul_configs.get('prefilter_fill', 'estimate') == 'sentinel':
+        cost_matrix = np.full(straight.shape, PREFILTER_SENTINEL)
+    else:
+        cost_matrix = straight * ratio
+    cost_matrix[rows, cols] = np.where(np.isnan(road), straight[rows, cols] * ratio, road)
+    return cost_matrix
+
+
+# Median road/straight-line distance ratio of the routed pairs (NaN road distances are
+# skipped; 1.3 when nothing could be measured)
+def detour_ratio(road, straight):
+    valid = ~np.isnan(road) & (straight > 0)
+    return np.median(road[valid] / straight[valid]) if valid.any() else 1.3
+
+
+# Calculate ETA-based cost matrix (larger set first, like the distance matrices)
 def eta_cost_matrix(active_passenger, empty_vehicle, time, simul_configs):
-    YMD = simul_configs['YMD']
-    eta_model = simul_configs['eta_model']
-    
-    # Extract time features
-    target_minute = time % 60
-    target_hour = time // 60
-    target_weekday = YMD.weekday()
-    target_holiday = 1 if target_weekday >= 5 else 0
+    predictor = simul_configs.get('eta_predictor') or ETAPredictor.from_configs(simul_configs)
 
     # Extract coordinates
-    ride_lon = empty_vehicle['lon'].tolist()
-    ride_lat = empty_vehicle['lat'].tolist()
-    alight_lon = active_passenger['ride_lon'].tolist()
-    alight_lat = active_passenger['ride_lat'].tolist()
-
-    # Expand coordinates to match dimensions
-    if len(active_passenger) >= len(empty_vehicle):
-        alight_lon = np.repeat(alight_lon, len(empty_vehicle)).tolist()
-        alight_lat = np.repeat(alight_lat, len(empty_vehicle)).tolist()
-        ride_lon = ride_lon * len(active_passenger)
-        ride_lat = ride_lat * len(active_passenger)
-    else: 
-        ride_lon = np.repeat(ride_lon, len(active_passenger)).tolist()
-        ride_lat = np.repeat(ride_lat, len(active_passenger)).tolist()
-        alight_lon = alight_lon * len(empty_vehicle)
-        alight_lat = alight_lat * len(empty_vehicle)
-
-    # Create ETA input dataframe
-    eta_inputData_for_cost_matrix = pd.DataFrame({
-        "minute": target_minute, 
-        'hour': target_hour,
-        'weekday': target_weekday, 
-        'holiday': target_holiday, 
-        "ride_lat": ride_lat, 
-        "ride_lon": ride_lon,
-        'alight_lat': alight_lat, 
-        'alight_lon': alight_lon
-    })
-    
-    # Convert to categorical types
-    for target_col in ['minute', 'hour', 'weekday', 'holiday']:
-        eta_inputData_for_cost_matrix[target_col] = eta_inputData_for_cost_matrix[target_col].astype('category')
-    
-    # Calculate distances
-    eta_inputData_for_cost_matrix['straight_distance'] = calculate_straight_distance(
-        eta_inputData_for_cost_matrix['ride_lat'].values, 
-        eta_inputData_for_cost_matrix['ride_lon'].values,
-        eta_inputData_for_cost_matrix['alight_lat'].values,
-        eta_inputData_for_cost_matrix['alight_lon'].values
-    )
-    
-    # Get OSRM distances
-    osrm_rs = [
-        osrm_routing_machine([row['ride_lat'], row['ride_lon'], 
-                            row['alight_lat'], row['alight_lon']])
-        for _, row in eta_inputData_for_cost_matrix.iterrows()
-    ]
-    
-    eta_inputData_for_cost_matrix['osrm_distance'] = [
-        rs['distance'] / 1000 if rs is not None else 0.5 
-        for rs in osrm_rs
-    ]
-    
-    # Select features for prediction
-    eta_inputData_for_cost_matrix = eta_inputData_for_cost_matrix[[
-        'weekday', 'holiday', 'hour', 'minute', 'straight_distance', 'osrm_distance'
-    ]]
+    V = empty_vehicle[['lat', 'lon']].to_numpy(dtype=np.float64)
+    P = active_passenger[['ride_lat', 'ride_lon']].to_numpy(dtype=np.float64)
+
+    # Vehicle -> passenger pairs, passenger-major when passengers are the larger set
+    if len(P) >= len(V):
+        p_idx, v_idx = np.repeat(np.arange(len(P)), len(V)), np.tile(np.arange(len(V)), len(P))
+    else:
+        v_idx, p_idx = np.repeat(np.arange(len(V)), len(P)), np.tile(np.arange(len(P)), len(V))
+    OD = np.hstack([V[v_idx], P[p_idx]])
+
+    # Get OSRM distances (km, 0.5 when a pair cannot be routed)
+    if simul_configs.get('street_matrix_backend', 'table') == 'route':
+        osrm_rs = route_many(OD.tolist(), simul_configs.get('routing_workers', 8),
+                             geometry=not simul_configs.get('metrics_only', False))
+        osrm_distance = np.array([rs['distance'] / 1000 if rs is not None else 0.5 for rs in osrm_rs])
+    else:
+        # One table lookup (vehicle -> passenger) for all pairs
+        distance, _ = osrm_table(V.tolist(), P.tolist())
+        osrm_distance = distance[v_idx, p_idx] / 1000
+        osrm_distance = np.where(np.isnan(osrm_distance), 0.5, osrm_distance)
 
     # Predict and reshape cost matrix
-    eta_model_cost_matrix = eta_model.predict(eta_inputData_for_cost_matrix)
+    eta_model_cost_matrix = predictor.predict(time, OD, osrm_distance, feature_set='distance')
     shape_list = [len(empty_vehicle), len(active_passenger)]
     eta_model_cost_matrix = eta_model_cost_matrix.reshape(max(shape_list), min(shape_list))
 
@@ -98,19 +129,10 @@ def eta_cost_matrix(active_passenger, empty_vehicle, time, simul_configs):
 
 # Calculate dispatch cost matrix based on configuration
 def dispatch_cost_matrix(active_passenger, empty_vehicle, time, simul_configs):
-    
-    # Helper function for haversine distance matrix
-    def haversine_distance_cost_matrix(A, B):
-        costs = []
-        for a in A:
-            cost = list(map(lambda data: calculate_straight_distance(
-                data[0], data[1], a[0], a[1]
-            ).tolist(), B))
-            costs.append(cost)
-        return np.array(costs)
-        
+
     matrix_mode = simul_configs['matrix_mode']
     dispatch_mode = simul_configs['dispatch_mode']
+    haversine_dtype = simul_configs.get('haversine_dtype', 'float64')
     
     # Prepare data
     active_passenger, empty_vehicle = cost_matrix_data_prepare(
@@ -123,28 +145,33 @@ def dispatch_cost_matrix(active_passenger, empty_vehicle, time, simul_configs):
         if matrix_mode == 'haversine_distance':
             # Larger set goes first for optimization
             if len(active_passenger) >= len(empty_vehicle):
-                cost_matrix = haversine_distance_cost_matrix(active_passenger, empty_vehicle)
+                cost_matrix = haversine_matrix(active_passenger, empty_vehicle, haversine_dtype)
             else:
-                cost_matrix = haversine_distance_cost_matrix(empty_vehicle, active_passenger)
+                cost_matrix = haversine_matrix(empty_vehicle, active_passenger, haversine_dtype)
         
         elif matrix_mode == 'street_distance':
-            # Create all possible combinations
+            # Larger set goes first for optimization
             if len(active_passenger) >= len(empty_vehicle):
-                costs = np.array([[a + b for b in empty_vehicle] for a in active_passenger])
+                cost_matrix = street_distance_matrix(active_passenger, empty_vehicle, simul_configs)
             else:
-                costs = np.array([[a + b for b in active_passenger] for a in empty_vehicle])
-            
-            costs_shape = costs.shape
-            costs = costs.reshape(costs_shape[0] * costs_shape[1], costs_shape[2])
-            
-            # Sequential processing (Pool removed)
-            cost_matrix = [osrm_routing_machine(cost)['distance'] for cost in costs]
-            
-            cost_matrix = np.array(cost_matrix).reshape(costs_shape[0], costs_shape[1])
-            cost_matrix = cost_matrix / 1000  # Convert to km
+                cost_matrix = street_distance_matrix(empty_vehicle, active_passenger, simul_configs)
             
+        elif matrix_mode == 'prefiltered_street_distance':
+            # Candidates are picked per passenger, then oriented with the larger set first
+            cost_matrix = prefiltered_street_distance_matrix(active_passenger, empty_vehicle, simul_configs)
+            if len(active_passenger) < len(empty_vehicle):
+                cost_matrix = cost_matrix.T
+
         elif matrix_mode == 'ETA':
             cost_matrix = eta_cost_matrix(active_passenger, empty_vehicle, time, simul_configs)
+
+        elif matrix_mode == 'detour_travel_time':
+            # Calibrated travel time without router calls; larger set goes first
+            detour_model = simul_configs.get('detour_model') or DetourModel.from_configs(simul_configs)
+            if len(active_passenger) >= len(empty_vehicle):
+                cost_matrix = detour_model.duration_matrix(active_passenger, empty_vehicle, time, haversine_dtype)
+            else:
+                cost_matrix = detour_model.duration_matrix(empty_vehicle, active_passenger, time, haversine_dtype)
             
         else:
             raise ValueError('matrix_mode is not defined')
@@ -153,22 +180,105 @@ def dispatch_cost_matrix(active_passenger, empty_vehicle, time, simul_configs):
     elif dispatch_mode == 'in_order':
         
         if matrix_mode == 'haversine_distance':
-            active_passenger = active_passenger[0]
-            costs = np.array([active_passenger + vehicle for vehicle in empty_vehicle])
-            cost_matrix = calculate_straight_distance(
-                costs[:, 0], costs[:, 1], costs[:, 2], costs[:, 3]
-            )
+            cost_matrix = haversine_matrix(active_passenger[:1], empty_vehicle, haversine_dtype)
+            cost_matrix = cost_matrix.reshape(-1)
             
         elif matrix_mode == 'street_distance':
-            active_passenger = active_passenger[0]
-            costs = [active_passenger + vehicle for vehicle in empty_vehicle]
-            
-            # Sequential processing (Pool removed)
-            cost_matrix = [osrm_routing_machine(cost)['distance'] for cost in costs]
-            cost_matrix = np.array(cost_matrix) / 1000  # Convert to km
+            cost_matrix = street_distance_matrix(active_passenger[:1], empty_vehicle, simul_configs)
+            cost_matrix = cost_matrix.reshape(-1)
+
+        elif matrix_mode == 'prefiltered_street_distance':
+            cost_matrix = prefiltered_street_distance_matrix(active_passenger[:1], empty_vehicle, simul_configs)
+            cost_matrix = cost_matrix.reshape(-1)
             
         elif matrix_mode == 'ETA':
             cost_matrix = eta_cost_matrix(active_passenger, empty_vehicle, time, simul_configs)
             cost_matrix = cost_matrix.reshape(-1)
+
+        elif matrix_mode == 'detour_travel_time':
+            detour_model = simul_configs.get('detour_model') or DetourModel.from_configs(simul_configs)
+            cost_matrix = detour_model.duration_matrix(active_passenger[:1], empty_vehicle, time, haversine_dtype)
+            cost_matrix = cost_matrix.reshape(-1)
             
-    return cost_matrix
\ No newline at end of file
+    return cost_matrix
+
+
+# Sparse passenger-vehicle candidate graph for optimization dispatch.
+# Each passenger is linked to its `candidate_k` nearest idle vehicles (straight-line, from a
+# grid index) within `candidate_radius` km; only those pairs get a cost in the matrix_mode's
+# units. Returns passenger positions, vehicle positions and costs of the candidate arcs.
+def candidate_cost_graph(active_passenger, empty_vehicle, time, simul_configs):
+    haversine_dtype = simul_configs.get('haversine_dtype', 'float64')
+    k = simul_configs.get('candidate_k') or len(empty_vehicle)
+    radius = simul_configs.get('candidate_radius') or np.inf
+
+    P = active_passenger[['ride_lat', 'ride_lon']].to_numpy(dtype=np.float64)
+    V = empty_vehicle[['lat', 'lon']].to_numpy(dtype=np.float64)
+    index = HaversineGridIndex(V[:, 0], V[:, 1], dtype=haversine_dtype)
+
+    p_idx, v_idx, straight = [], [], []
+    for i, (lat, lon) in enumerate(P.tolist()):
+        vehicles, distances = index.nearest_k(lat, lon, k=k, radius=radius)
+        p_idx.append(np.full(len(vehicles), i, dtype=np.int64))
+        v_idx.append(vehicles)
+        straight.append(distances)
+    p_idx, v_idx = np.concatenate(p_idx), np.concatenate(v_idx)
+    costs = np.concatenate(straight).astype(np.float64)
+
+    matrix_mode = simul_configs['matrix_mode']
+    if matrix_mode == 'haversine_distance' or len(p_idx) == 0:
+        pass
+
+    elif matrix_mode in ('street_distance', 'prefiltered_street_distance'):
+        # One routed pair per candidate arc; arcs that could not be routed get the
+        # straight-line distance times the detour ratio of the routed ones
+        road = candidate_road_distance(active_passenger, empty_vehicle, p_idx, v_idx, 'passenger_to_vehicle', simul_configs)
+        costs = np.where(np.isnan(road), costs * detour_ratio(road, costs), road)
+
+    elif matrix_mode == 'ETA':
+        # The ETA model is evaluated on the candidate arcs (vehicle -> passenger) only,
+        # with road distances of 0.5 km for pairs that cannot be routed
+        predictor = simul_configs.get('eta_predictor') or ETAPredictor.from_configs(simul_configs)
+        road = candidate_road_distance(active_passenger, empty_vehicle, p_idx, v_idx, 'vehicle_to_passenger', simul_configs)
+        osrm_distance = np.where(np.isnan(road), 0.5, road)
+        costs = predictor.predict(time, np.hstack([V[v_idx], P[p_idx]]), osrm_distance, feature_set='distance')
+
+    elif matrix_mode == 'detour_travel_time':
+        # Calibrated travel time of each candidate arc, no router calls
+        detour_model = simul_configs.get('detour_model') or DetourModel.from_configs(simul_configs)
+        costs = detour_model.duration(np.hstack([V[v_idx], P[p_idx]]), time)
+
+    else:
+        raise ValueError('matrix_mode is not defined')
+
+    return p_idx, v_idx, costs
+
+
+# Road distances (km, NaN where a pair could not be routed) of candidate arcs (p_idx, v_idx).
+# 'passenger_to_vehicle' routes one pair per arc; 'vehicle_to_passenger' uses
+# street_matrix_backend ('table': one lookup from the arcs' vehicles to their passengers).
+# With cost_matrix_cache, arcs linked on an earlier tick (same passenger, vehicle and vehicle
+# position) are not routed again; the router answer does not depend on the tick.
+def candidate_road_distance(active_passenger, empty_vehicle, p_idx, v_idx, direction, simul_configs):
+    P = active_passenger[['ride_lat', 'ride_lon']].to_numpy(dtype=np.float64)
+    V = empty_vehicle[['lat', 'lon']].to_numpy(dtype=np.float64)
+
+    def compute(arcs):
+        arc_p, arc_v = p_idx[arcs], v_idx[arcs]
+        if direction == 'passenger_to_vehicle' or simul_configs.get('street_matrix_backend', 'table') == 'route':
+            pairs = np.hstack([P[arc_p], V[arc_v]] if direction == 'passenger_to_vehicle' else [V[arc_v], P[arc_p]])
+            routed = route_many(pairs.tolist(), simul_configs.get('routing_workers', 8),
+                                geometry=not simul_configs.get('metrics_only', False))
+            return np.array([rs['distance'] if rs is not None else np.nan for rs in routed]) / 1000  # Convert to km
+
+        sources, destinations = np.unique(arc_v), np.unique(arc_p)
+        distance, _ = osrm_table(V[sources].tolist(), P[destinations].tolist())
+        return distance[np.searchsorted(sources, arc_v), np.searchsorted(destinations, arc_p)] / 1000
+
+    matrix_cache = simul_configs.get('matrix_cache')
+    if matrix_cache is None:
+        return compute(np.arange(len(p_idx)))
+
+    passenger_ids = active_passenger['ID'].tolist()
+    vehicle_keys = list(zip(empty_vehicle['vehicle_id'].tolist(), V[:, 0].tolist(), V[:, 1].tolist()))
+    return matrix_cache.get(passenger_ids, vehicle_keys, p_idx, v_idx, direction, compute)
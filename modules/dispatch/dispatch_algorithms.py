@@ -3,8 +3,11 @@ import pandas as pd
 import itertools
 from itertools import repeat
 from ortools.linear_solver import pywraplp
+from ortools.graph.python import min_cost_flow
 
-from .cost_matrix import dispatch_cost_matrix
+from .cost_matrix import dispatch_cost_matrix, eta_cost_matrix, cost_matrix_data_prepare
+from modules.routing.detour_model import DetourModel
+from modules.utils.spatial_index import HaversineGridIndex
 
 
 # Optimization-based dispatch using OR-Tools
@@ -75,8 +78,105 @@ def ortools_dispatch(active_passenger, empty_vehicle, cost_matrix):
     return dispatch_inf
 
 
+# Assignment dispatch as a min-cost flow (same matching problem as ortools_dispatch).
+# Flow runs source -> larger set -> smaller set -> sink with unit capacities, so every member
+# of the smaller set is matched once; costs are scaled to integers by `cost_scale`.
+def min_cost_flow_dispatch(active_passenger, empty_vehicle, cost_matrix, cost_scale=1e6):
+    cost_matrix = np.asarray(cost_matrix, dtype=np.float64)
+    A_cnt, B_cnt = cost_matrix.shape
+
+    # Nodes: 0 source, 1..A_cnt larger set, A_cnt+1..A_cnt+B_cnt smaller set, last sink
+    source, sink = 0, A_cnt + B_cnt + 1
+    A_nodes = np.arange(1, A_cnt + 1)
+    B_nodes = np.arange(A_cnt + 1, A_cnt + B_cnt + 1)
+
+    tails = np.concatenate([np.full(A_cnt, source), np.repeat(A_nodes, B_cnt), B_nodes])
+    heads = np.concatenate([A_nodes, np.tile(B_nodes, A_cnt), np.full(B_cnt, sink)])
+    costs = np.concatenate([
+        np.zeros(A_cnt), np.rint(cost_matrix.reshape(-1) * cost_scale), np.zeros(B_cnt)
+    ]).astype(np.int64)
+    capacities = np.ones(len(tails), dtype=np.int64)
+
+    smcf = min_cost_flow.SimpleMinCostFlow()
+    smcf.add_arcs_with_capacity_and_unit_cost(tails, heads, capacities, costs)
+    smcf.set_node_supply(source, B_cnt)
+    smcf.set_node_supply(sink, -B_cnt)
+    status = smcf.solve()
+
+    # Extract solution (pair arcs carrying flow, in larger-set order like ortools_dispatch)
+    A_iloc = []
+    B_iloc = []
+
+    if status == smcf.OPTIMAL:
+        pair_arcs = np.arange(A_cnt, A_cnt + A_cnt * B_cnt)
+        used = pair_arcs[smcf.flows(pair_arcs) > 0] - A_cnt
+        A_iloc = (used // B_cnt).tolist()
+        B_iloc = (used % B_cnt).tolist()
+
+    # Calculate matched distances
+    iloc_distance = [cost_matrix[iloc_1, iloc_2] for iloc_1, iloc_2 in zip(A_iloc, B_iloc)]
+
+    # Return results in correct order
+    if len(active_passenger) >= len(empty_vehicle):
+        dispatch_inf = {'vehicle': B_iloc, 'passenger': A_iloc, 'distance': iloc_distance}
+    else:
+        dispatch_inf = {'vehicle': A_iloc, 'passenger': B_iloc, 'distance': iloc_distance}
+
+    return dispatch_inf
+
+
+# Assignment dispatch on a sparse candidate graph (see candidate_cost_graph) as a min-cost flow.
+# Every passenger either takes one of its candidate arcs or an unmatched arc costing
+# `unmatched_penalty`, so passengers without a nearby vehicle simply stay waiting.
+def candidate_graph_dispatch(passenger_cnt, vehicle_cnt, p_idx, v_idx, costs, unmatched_penalty, cost_scale=1e6):
+    # Nodes: 0 source, 1..P passengers, P+1..P+V vehicles, last sink
+    source, sink = 0, passenger_cnt + vehicle_cnt + 1
+    P_nodes = np.arange(1, passenger_cnt + 1)
+    V_nodes = np.arange(passenger_cnt + 1, passenger_cnt + vehicle_cnt + 1)
+    arc_cnt = len(p_idx)
+
+    tails = np.concatenate([np.full(passenger_cnt, source), P_nodes[p_idx], V_nodes, P_nodes])
+    heads = np.concatenate([P_nodes, V_nodes[v_idx], np.full(vehicle_cnt, sink), np.full(passenger_cnt, sink)])
+    arc_costs = np.concatenate([
+        np.zeros(passenger_cnt), np.rint(np.asarray(costs, dtype=np.float64) * cost_scale),
+        np.zeros(vehicle_cnt), np.full(passenger_cnt, np.rint(unmatched_penalty * cost_scale))
+    ]).astype(np.int64)
+    capacities = np.ones(len(tails), dtype=np.int64)
+
+    smcf = min_cost_flow.SimpleMinCostFlow()
+    smcf.add_arcs_with_capacity_and_unit_cost(tails, heads, capacities, arc_costs)
+    smcf.set_node_supply(source, passenger_cnt)
+    smcf.set_node_supply(sink, -passenger_cnt)
+    status = smcf.solve()
+
+    # Extract solution (candidate arcs carrying flow, in passenger order)
+    vehicle_iloc = []
+    passenger_iloc = []
+    iloc_distance = []
+
+    if status == smcf.OPTIMAL and arc_cnt > 0:
+        candidate_arcs = np.arange(passenger_cnt, passenger_cnt + arc_cnt)
+        used = np.flatnonzero(smcf.flows(candidate_arcs) > 0)
+        used = used[np.argsort(p_idx[used], kind='stable')]
+        passenger_iloc = p_idx[used].tolist()
+        vehicle_iloc = v_idx[used].tolist()
+        iloc_distance = list(np.asarray(costs)[used])
+
+    dispatch_inf = {'vehicle': vehicle_iloc, 'passenger': passenger_iloc, 'distance': iloc_distance}
+
+    return dispatch_inf
+
+
 # Sequential first-come-first-served dispatch
 def in_order_dispatch(active_ps, empty_vh, time, simul_configs):
+
+    # Straight-line matching is answered from a spatial index of the idle vehicles
+    if simul_configs['matrix_mode'] == 'haversine_distance':
+        return in_order_grid_dispatch(active_ps, empty_vh, simul_configs)
+
+    # The ETA and detour models score every passenger that can still be served in one batch
+    if simul_configs['matrix_mode'] in ('ETA', 'detour_travel_time'):
+        return in_order_batch_dispatch(active_ps, empty_vh, time, simul_configs)
     
     active_passengers = active_ps.copy()
     empty_vehicles = empty_vh.copy()
@@ -113,4 +213,73 @@ def in_order_dispatch(active_ps, empty_vh, time, simul_configs):
         
     dispatch_inf = {'vehicle': vehicle_iloc, 'passenger': passenger_iloc, 'distance': iloc_distance} 
     
-    return dispatch_inf
\ No newline at end of file
+    return dispatch_inf
+
+
+# First-come-first-served dispatch on haversine distance over a grid index of idle vehicles.
+# Matches are the same as scanning every idle vehicle (closest one, ties to the earliest),
+# in roughly O(P log V) instead of O(P * V).
+def in_order_grid_dispatch(active_ps, empty_vh, simul_configs):
+    index = HaversineGridIndex(
+        empty_vh['lat'].to_numpy(), empty_vh['lon'].to_numpy(),
+        dtype=simul_configs.get('haversine_dtype', 'float64')
+    )
+
+    vehicle_iloc = []
+    passenger_iloc = []
+    iloc_distance = []
+
+    # Process passengers in order
+    for idx, lat, lon in zip(active_ps.index, active_ps['ride_lat'].tolist(), active_ps['ride_lon'].tolist()):
+        if len(index) == 0:
+            break
+
+        # Find closest remaining vehicle and remove it from the index
+        position, match_distance = index.nearest_haversine(lat, lon)
+        index.remove(position)
+
+        # Record match
+        vehicle_iloc.append(empty_vh.index[position])
+        passenger_iloc.append(idx)
+        iloc_distance.append(match_distance)
+
+    dispatch_inf = {'vehicle': vehicle_iloc, 'passenger': passenger_iloc, 'distance': iloc_distance}
+
+    return dispatch_inf
+
+
+# First-come-first-served dispatch on a cost matrix built once per tick (one ETA model call,
+# or the calibrated detour travel time). Only the first len(empty_vh) passengers can be
+# matched before vehicles run out, so their cost rows are computed together and each
+# passenger takes the cheapest vehicle still free (ties to the earliest), the same matches
+# as computing one row per passenger.
+def in_order_batch_dispatch(active_ps, empty_vh, time, simul_configs):
+    active_ps = active_ps.iloc[:len(empty_vh)]
+    if simul_configs['matrix_mode'] == 'ETA':
+        cost_matrix = eta_cost_matrix(active_ps, empty_vh, time, simul_configs)
+        if len(active_ps) < len(empty_vh):
+            cost_matrix = cost_matrix.T  # Rows are passengers
+    else:
+        P, V = cost_matrix_data_prepare(active_ps, empty_vh, simul_configs)
+        detour_model = simul_configs.get('detour_model') or DetourModel.from_configs(simul_configs)
+        cost_matrix = detour_model.duration_matrix(P, V, time, simul_configs.get('haversine_dtype', 'float64'))
+
+    vehicle_iloc = []
+    passenger_iloc = []
+    iloc_distance = []
+    taken = np.zeros(len(empty_vh), dtype=bool)
+
+    # Process passengers in order
+    for row, idx in enumerate(active_ps.index):
+        costs = np.where(taken, np.inf, cost_matrix[row])
+        position = int(np.argmin(costs))
+        taken[position] = True
+
+        # Record match
+        vehicle_iloc.append(empty_vh.index[position])
+        passenger_iloc.append(idx)
+        iloc_distance.append(cost_matrix[row, position])
+
+    dispatch_inf = {'vehicle': vehicle_iloc, 'passenger': passenger_iloc, 'distance': iloc_distance}
+
+    return dispatch_inf
@@ -1,77 +1,92 @@
 import sys
 import os
+from functools import partial
 import pandas as pd
 import numpy as np 
 from multiprocess import Pool
 
-from modules.routing.osrm_client import osrm_routing_machine
+from modules.routing.osrm_client import osrm_routing_machine, route_many, summarize_route
 from modules.utils.distance_utils import calculate_straight_distance
-from modules.engine.io_manager import save_json_data
-from modules.dispatch.cost_matrix import dispatch_cost_matrix
-from modules.dispatch.dispatch_algorithms import in_order_dispatch, ortools_dispatch
+from modules.dispatch.eta_inference import ETAPredictor
+from modules.engine.io_manager import save_result_records
+from modules.dispatch.cost_matrix import dispatch_cost_matrix, candidate_cost_graph
+from modules.dispatch.dispatch_algorithms import (
+    in_order_dispatch, ortools_dispatch, min_cost_flow_dispatch, candidate_graph_dispatch
+)
 
 
 # Convert travel time to ETA result using prediction model
-def change_travel_time_to_eta_result(data, time, simul_configs):
-    YMD = simul_configs['YMD']
-    eta_model = simul_configs['eta_model']
-
-    # Extract time features
-    target_minute = time % 60
-    target_hour = time // 60
-
-    target_weekday = YMD.weekday()
-    target_holiday = 1 if target_weekday >= 5 else 0
-    
-    # Extract location coordinates
-    ride_lat = data[:, 0]
-    ride_lon = data[:, 1]
-    
-    alight_lat = data[:, 2]
-    alight_lon = data[:, 3]
-    
-    # Create input dataframe for ETA model
-    eta_inputData = pd.DataFrame({
-                                    "minute": target_minute, 
-                                    'hour': target_hour, 
-                                    'weekday': target_weekday, 
-                                    'holiday': target_holiday, 
-                                    "ride_lat": ride_lat, 
-                                    "ride_lon": ride_lon, 
-                                    'alight_lat': alight_lat, 
-                                    'alight_lon': alight_lon
-    })
-    
-    # Convert to categorical types
-    for col in ['minute', 'hour', 'weekday', 'holiday']:
-        eta_inputData[col] = eta_inputData[col].astype('category')
+# (data rows are [ride_lat, ride_lon, alight_lat, alight_lon]; routing_results, when given,
+# are the already routed legs in the same order)
+def change_travel_time_to_eta_result(data, time, simul_configs, routing_results=None):
+    predictor = simul_configs.get('eta_predictor') or ETAPredictor.from_configs(simul_configs)
+    data = np.asarray(data, dtype=np.float64)
 
     # Add distance features for metro region
     if simul_configs['relocation_region'] == 'metro':
-        eta_inputData['straight_distance'] = calculate_straight_distance(
-        eta_inputData['ride_lat'].values, 
-        eta_inputData['ride_lon'].values,
-        eta_inputData['alight_lat'].values,
-        eta_inputData['alight_lon'].values
-    )
-        
-        osrm_rs = [
-            osrm_routing_machine([row['ride_lat'], row['ride_lon'], 
-                                 row['alight_lat'], row['alight_lon']])
-            for _, row in eta_inputData.iterrows()
-        ]
-        
-        eta_inputData['osrm_distance'] = [
-            rs['distance'] / 1000 if rs is not None else 0.5 
-            for rs in osrm_rs
-        ]
-        
-        eta_inputData = eta_inputData[['weekday', 'holiday', 'hour', 
-                                       'minute', 'straight_distance', 'osrm_distance']]   
+        if routing_results is None:
+            routing_results = route_many(data.tolist(), simul_configs.get('routing_workers', 8))
+        osrm_distance = [rs['distance'] / 1000 if rs is not None else 0.5 for rs in routing_results]
+        return predictor.predict(time, data, osrm_distance, feature_set='distance')
 
     # Predict travel time
-    eta_result = eta_model.predict(eta_inputData)
-    return eta_result
+    return predictor.predict(time, data, feature_set='coords')
+
+
+# Build vehicle markers for the idle period that ends with this dispatch
+def build_vehicle_marker_records(vehicle_marker_inf, time):
+    return [
+        {
+            'vehicle_id': row['vehicle_id'], 
+            'cartype': row['cartype'],
+            'location': [row['lon'], row['lat']], 
+            'timestamp': [row['temporary_stopTime'], time]
+        }
+        for _, row in vehicle_marker_inf.iterrows()
+    ]
+
+
+# Build markers for passengers picked up by this dispatch
+def build_passenger_marker_records(passenger_marker_inf):
+    return [
+        {
+            'passenger_id': row['P_ID'], 
+            'status': 1,
+            'location': [row['P_ride_lon'], row['P_ride_lat']],
+            'timestamp': [row['P_request_time'], row['P_ride_time']]
+        }
+        for _, row in passenger_marker_inf.iterrows()
+    ]
+
+
+# Build pickup (board 0) and trip (board 1) records for the dispatched vehicles
+def build_trip_records(trip_inf):
+    # Create separate trip records for origin and destination
+    trip_inf_O = [
+        {
+            'vehicle_id': row['vehicle_id'], 
+            'cartype': row['cartype'], 
+            'passenger_id': row['P_ID'], 
+            'board': 0,
+            'trip': row['O_route'], 
+            'timestamp': row['O_timestamp']
+        }
+        for _, row in trip_inf.iterrows()
+    ]
+    
+    trip_inf_D = [
+        {
+            'vehicle_id': row['vehicle_id'], 
+            'cartype': row['cartype'],
+            'passenger_id': row['P_ID'], 
+            'board': 1,
+            'trip': row['D_route'], 
+            'timestamp': row['D_timestamp']
+        }
+        for _, row in trip_inf.iterrows()
+    ]
+
+    return trip_inf_O + trip_inf_D
 
 
 # Process active vehicles and save trip/marker information
@@ -81,14 +96,39 @@ def address_current_active_vehicle(current_active_vehicle, time, save_path, simu
     O = current_active_vehicle[['lat', 'lon', 'P_ride_lat', 'P_ride_lon']].values
     D = current_active_vehicle[['P_ride_lat', 'P_ride_lon', 'P_alight_lat', 'P_alight_lon']].values
     
-    # Get OSRM routing results (sequential processing)
-    routing_result_O = [osrm_routing_machine(o) for o in O]
-    routing_result_D = [osrm_routing_machine(d) for d in D]
+    # Metrics-only runs route durations and distances without geometry
+    metrics_only = simul_configs.get('metrics_only', False)
+
+    if simul_configs.get('routing_backend', 'osrm') == 'detour':
+        # Calibrated travel model: pickup legs depart now, trip legs once the passenger boards
+        detour_model = simul_configs['detour_model']
+        routing_result_O = detour_model.routes(O, time)
+        routing_result_D = detour_model.routes(D, time + np.array([o['duration'] for o in routing_result_O]))
+    else:
+        # Trip legs precomputed before the run are looked up by passenger ID
+        trip_leg_store = simul_configs.get('trip_leg_store')
+        if trip_leg_store is not None:
+            routing_result_D = trip_leg_store.lookup(current_active_vehicle['P_ID'].values, D)
+            if metrics_only:
+                routing_result_D = [rs if rs is None else summarize_route(rs) for rs in routing_result_D]
+            missing = [idx for idx, rs in enumerate(routing_result_D) if rs is None]
+        else:
+            routing_result_D = [None] * len(D)
+            missing = list(range(len(D)))
+
+        # Get OSRM routing results for every pickup and remaining trip leg of this tick concurrently
+        routing_results = route_many(np.vstack([O, D[missing]]), simul_configs.get('routing_workers', 8),
+                                     geometry=not metrics_only)
+        routing_result_O = routing_results[:len(O)]
+        for idx, rs in zip(missing, routing_results[len(O):]):
+            routing_result_D[idx] = rs
+    routing_results = routing_result_O + routing_result_D
 
     # Apply ETA model if available
     if simul_configs['eta_model'] is not None: 
-        eta_result_O = change_travel_time_to_eta_result(O, time, simul_configs)
-        eta_result_D = change_travel_time_to_eta_result(D, time, simul_configs)
+        # One prediction batch for the pickup and trip legs
+        eta_result = change_travel_time_to_eta_result(np.vstack([O, D]), time, simul_configs, routing_results)
+        eta_result_O, eta_result_D = eta_result[:len(O)], eta_result[len(O):]
         
         for idx in range(len(current_active_vehicle)):
             # Adjust origin timestamps
@@ -123,16 +163,8 @@ def address_current_active_vehicle(current_active_vehicle, time, save_path, simu
     ].reset_index(drop=True)
     
     if len(vehicle_marker_inf) >= 1:
-        vehicle_marker_inf = [
-            {
-                'vehicle_id': row['vehicle_id'], 
-                'cartype': row['cartype'],
-                'location': [row['lon'], row['lat']], 
-                'timestamp': [row['temporary_stopTime'], time]
-            }
-            for _, row in vehicle_marker_inf.iterrows()
-        ]
-        save_json_data(vehicle_marker_inf, save_path=save_path, file_name='vehicle_marker')
+        save_result_records(partial(build_vehicle_marker_records, vehicle_marker_inf, time),
+                            simul_configs, file_name='vehicle_marker')
     del vehicle_marker_inf
 
     # Save passenger marker data
@@ -140,16 +172,8 @@ def address_current_active_vehicle(current_active_vehicle, time, save_path, simu
     passenger_marker_inf['P_ride_time'] = [o['timestamp'][-1] + time for o in routing_result_O]
     
     if len(passenger_marker_inf) >= 1:
-        passenger_marker_inf = [
-            {
-                'passenger_id': row['P_ID'], 
-                'status': 1,
-                'location': [row['P_ride_lon'], row['P_ride_lat']],
-                'timestamp': [row['P_request_time'], row['P_ride_time']]
-            }
-            for _, row in passenger_marker_inf.iterrows()
-        ]
-        save_json_data(passenger_marker_inf, save_path=save_path, file_name='passenger_marker')
+        save_result_records(partial(build_passenger_marker_records, passenger_marker_inf),
+                            simul_configs, file_name='passenger_marker')
     del passenger_marker_inf
 
     # Save trip data
@@ -167,37 +191,9 @@ def address_current_active_vehicle(current_active_vehicle, time, save_path, simu
     trip_inf['O_timestamp'] = O_timestamp
     trip_inf['D_timestamp'] = D_timestamp
 
-    # Create separate trip records for origin and destination
-    trip_inf_O = [
-        {
-            'vehicle_id': row['vehicle_id'], 
-            'cartype': row['cartype'], 
-            'passenger_id': row['P_ID'], 
-            'board': 0,
-            'trip': row['O_route'], 
-            'timestamp': row['O_timestamp']
-        }
-        for _, row in trip_inf.iterrows()
-    ]
-    
-    trip_inf_D = [
-        {
-            'vehicle_id': row['vehicle_id'], 
-            'cartype': row['cartype'],
-            'passenger_id': row['P_ID'], 
-            'board': 1,
-            'trip': row['D_route'], 
-            'timestamp': row['D_timestamp']
-        }
-        for _, row in trip_inf.iterrows()
-    ]
-
-    trip_inf = []
-    trip_inf.extend(trip_inf_O)
-    trip_inf.extend(trip_inf_D)
-
-    save_json_data(trip_inf, save_path=save_path, file_name='trip')
-    del trip_inf, trip_inf_O, trip_inf_D
+    # Records are built by the result sink (on its writer thread when async output is on)
+    save_result_records(partial(build_trip_records, trip_inf), simul_configs, file_name='trip')
+    del trip_inf
 
     return current_active_vehicle
 
@@ -205,14 +201,26 @@ def address_current_active_vehicle(current_active_vehicle, time, save_path, simu
 # Select dispatch method and match passengers with vehicles
 def select_dispatch_method(requested_passenger, empty_vehicle, simul_configs, time):
     # Use optimization or in-order dispatch based on configuration
-    if simul_configs['dispatch_mode'] == 'optimization':
+    if simul_configs['dispatch_mode'] == 'optimization' and (
+            simul_configs.get('candidate_k') or simul_configs.get('candidate_radius')):
+        # Sparse candidate graph instead of the dense cost matrix
+        p_idx, v_idx, costs = candidate_cost_graph(requested_passenger, empty_vehicle, time, simul_configs)
+        dispatch_result = candidate_graph_dispatch(
+            len(requested_passenger), len(empty_vehicle), p_idx, v_idx, costs,
+            simul_configs.get('unmatched_penalty', 1000)
+        )
+
+    elif simul_configs['dispatch_mode'] == 'optimization':
         cost_matrix = dispatch_cost_matrix(
             requested_passenger, 
             empty_vehicle, 
             time,
             simul_configs
         )
-        dispatch_result = ortools_dispatch(requested_passenger, empty_vehicle, cost_matrix)
+        if simul_configs.get('optimization_solver', 'mip') == 'min_cost_flow':
+            dispatch_result = min_cost_flow_dispatch(requested_passenger, empty_vehicle, cost_matrix)
+        else:
+            dispatch_result = ortools_dispatch(requested_passenger, empty_vehicle, cost_matrix)
         del cost_matrix
         
     elif simul_configs['dispatch_mode'] == 'in_order':
@@ -244,38 +252,34 @@ def select_dispatch_method(requested_passenger, empty_vehicle, simul_configs, ti
     })
     current_active_vehicle['P_disembark_time'] = 0
 
-    # Update remaining unmatched vehicles and passengers
-    empty_vehicle = empty_vehicle.iloc[
-        list(set(empty_vehicle.index) - set(dispatch_result['vehicle']))
-    ].reset_index(drop=True)
-    
-    requested_passenger = requested_passenger.iloc[
-        list(set(requested_passenger.index) - set(dispatch_result['passenger']))
-    ].reset_index(drop=True)
-
-    return requested_passenger, empty_vehicle, current_active_vehicle        
+    return dispatch_result, current_active_vehicle
 
 
-# Main dispatch coordination function
+# Main dispatch coordination function (works on the engine's AgentTable stores)
 def dispatch_main(requested_passenger, active_vehicle, empty_vehicle, simul_configs, time):
     save_path = simul_configs['save_path']
-    
-    # Reset indices for clean processing
-    requested_passenger = requested_passenger.reset_index(drop=True)
-    empty_vehicle = empty_vehicle.reset_index(drop=True)
 
     # Perform dispatch when both passengers and vehicles are available
     if (len(requested_passenger) > 0) and (len(empty_vehicle) > 0):
-        requested_passenger, empty_vehicle, current_active_vehicle = select_dispatch_method(
-            requested_passenger, empty_vehicle, simul_configs, time
+        # DataFrame views are only built here, at the dispatch edge
+        passenger_slots = requested_passenger.slots()
+        vehicle_slots = empty_vehicle.slots()
+
+        dispatch_result, current_active_vehicle = select_dispatch_method(
+            requested_passenger.to_frame(passenger_slots),
+            empty_vehicle.to_frame(vehicle_slots),
+            simul_configs, time
         )
 
+        # Remove matched vehicles and passengers from the waiting pools
+        requested_passenger.remove(passenger_slots[np.asarray(dispatch_result['passenger'], dtype=np.int64)])
+        empty_vehicle.remove(vehicle_slots[np.asarray(dispatch_result['vehicle'], dtype=np.int64)])
+
         # Process matched vehicles and save trip data
         if len(current_active_vehicle) >= 1:
             current_active_vehicle = address_current_active_vehicle(
                 current_active_vehicle, time, save_path, simul_configs
             )
-            active_vehicle = pd.concat([active_vehicle, current_active_vehicle])
-        
-    active_vehicle = active_vehicle.reset_index(drop=True)
-    return requested_passenger, active_vehicle, empty_vehicle   
\ No newline at end of file
+            active_vehicle.append(current_active_vehicle)
+
+    return requested_passenger, active_vehicle, empty_vehicle
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+# Batching policy for dispatch rounds. Requests accumulate until `window` minutes have passed
+# since the last round (None runs a round at every tick) or until `batch_size` passengers are
+# waiting, and are then matched in one larger assignment. The policy also keeps the running
+# throughput and wait statistics written to record.csv.
+class DispatchWindow:
+
+    def __init__(self, window=None, batch_size=None):
+        self.window = window
+        self.batch_size = batch_size
+        self.next_round = -np.inf
+
+        self.rounds = 0          # dispatch rounds solved
+        self.dispatched = 0      # passengers matched
+        self.total_wait = 0.0    # minutes matched passengers waited since their request
+
+    @classmethod
+    def from_configs(cls, simul_configs):
+        return cls(simul_configs.get('dispatch_window'), simul_configs.get('dispatch_batch_size'))
+
+    # Whether a round should run at time with waiting_cnt passengers waiting
+    def due(self, time, waiting_cnt):
+        if waiting_cnt == 0:
+            return False
+        if self.window is None or time >= self.next_round - 1e-9:
+            return True
+        return self.batch_size is not None and waiting_cnt >= self.batch_size
+
+    # Close a round at time that matched passengers requested at request_times
+    def close_round(self, time, request_times):
+        request_times = np.asarray(request_times, dtype=np.float64)
+        self.rounds += 1
+        self.dispatched += len(request_times)
+        self.total_wait += float(np.sum(time - request_times))
+        if self.window is not None:
+            self.next_round = time + self.window
+
+    def stats(self):
+        return {
+            'dispatch_round_cnt': self.rounds,
+            'dispatched_passenger_cnt': self.dispatched,
+            'mean_dispatch_wait': self.total_wait / self.dispatched if self.dispatched > 0 else 0.0
+        }
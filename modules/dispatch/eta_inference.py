@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from modules.utils.distance_utils import calculate_straight_distance
+
+
+# Feature columns the ETA model is fed, by feature set
+ETA_FEATURES = {
+    'distance': ['weekday', 'holiday', 'hour', 'minute', 'straight_distance', 'osrm_distance'],
+    'coords': ['minute', 'hour', 'weekday', 'holiday', 'ride_lat', 'ride_lon', 'alight_lat', 'alight_lon']
+}
+
+
+# Batched inference for the ETA model. Features for any number of OD pairs are built with NumPy
+# (time features are constant within a tick), so a whole cost matrix or all pickup and trip legs
+# of a tick go through one predict call. Predictions are memoized per feature set, tick time and
+# OD rounded to `precision` decimals (plus the road distance for the 'distance' set); the memo
+# only holds the current tick because the time features change every tick.
+class ETAPredictor:
+
+    def __init__(self, eta_model, YMD, precision=6, memo=True):
+        self.eta_model = eta_model
+        self.weekday = YMD.weekday()
+        self.holiday = 1 if self.weekday >= 5 else 0
+        self.precision = precision
+        self.memo = memo
+
+        self._memo_time = None
+        self._memo = {}
+        self.predicted = 0   # rows sent to the model
+        self.hits = 0        # rows served from the memo
+
+    # Predictor for the run's ETA model (None when no model is configured)
+    @classmethod
+    def from_configs(cls, simul_configs):
+        if simul_configs.get('eta_model') is None:
+            return None
+        return cls(
+            simul_configs['eta_model'], simul_configs['YMD'],
+            precision=simul_configs.get('eta_memo_precision', 6),
+            memo=simul_configs.get('eta_memo', True)
+        )
+
+    # Model input frame for OD rows ([ride_lat, ride_lon, alight_lat, alight_lon]) at time
+    def features(self, time, OD, osrm_distance=None, feature_set='distance'):
+        n = len(OD)
+        frame = pd.DataFrame({
+            'minute': np.full(n, time % 60),
+            'hour': np.full(n, time // 60),
+            'weekday': np.full(n, self.weekday),
+            'holiday': np.full(n, self.holiday),
+            'ride_lat': OD[:, 0],
+            'ride_lon': OD[:, 1],
+            'alight_lat': OD[:, 2],
+            'alight_lon': OD[:, 3]
+        })
+
+        # Convert to categorical types
+        for col in ['minute', 'hour', 'weekday', 'holiday']:
+            frame[col] = frame[col].astype('category')
+
+        if feature_set == 'distance':
+            frame['straight_distance'] = calculate_straight_distance(OD[:, 0], OD[:, 1], OD[:, 2], OD[:, 3])
+            frame['osrm_distance'] = osrm_distance
+
+        return frame[ETA_FEATURES[feature_set]]
+
+    # Predicted travel times for OD rows at time; osrm_distance (km) is required for the
+    # 'distance' feature set
+    def predict(self, time, OD, osrm_distance=None, feature_set='distance'):
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        if osrm_distance is not None:
+            osrm_distance = np.asarray(osrm_distance, dtype=np.float64)
+        if len(OD) == 0:
+            return np.empty(0)
+        if not self.memo:
+            self.predicted += len(OD)
+            return np.asarray(self.eta_model.predict(self.features(time, OD, osrm_distance, feature_set)))
+
+        if time != self._memo_time:
+            self._memo_time, self._memo = time, {}
+
+        # Memo keys: feature set, quantized OD and (for 'distance') the road distance in meters
+        quantized = np.round(OD, self.precision).tolist()
+        if feature_set == 'distance':
+            meters = np.round(osrm_distance * 1000, 1).tolist()
+            keys = [(feature_set, *od, m) for od, m in zip(quantized, meters)]
+        else:
+            keys = [(feature_set, *od) for od in quantized]
+
+        result = np.empty(len(OD))
+        missing = []
+        for idx, key in enumerate(keys):
+            value = self._memo.get(key)
+            if value is None:
+                missing.append(idx)
+            else:
+                result[idx] = value
+        self.hits += len(OD) - len(missing)
+
+        if missing:
+            # Duplicate keys within the batch are predicted once
+            unique = {}
+            for idx in missing:
+                unique.setdefault(keys[idx], idx)
+            rows = np.fromiter(unique.values(), dtype=np.int64, count=len(unique))
+            predicted = np.asarray(self.eta_model.predict(self.features(
+                time, OD[rows], None if osrm_distance is None else osrm_distance[rows], feature_set
+            )), dtype=np.float64)
+            self.predicted += len(rows)
+
+            self._memo.update(zip(unique, predicted.tolist()))
+            result[missing] = [self._memo[keys[idx]] for idx in missing]
+
+        return result
+
+    def stats(self):
+        return {'predicted': self.predicted, 'memo_hits': self.hits}
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+# Road distances of passenger-vehicle pairs kept across dispatch ticks, so each tick only routes
+# the candidate arcs it has not seen before. Pairs are keyed by passenger ID and
+# (vehicle_id, lat, lon), so a vehicle that moved (e.g. dropped a passenger off) is routed again.
+# A pair is kept while its passenger is still waiting and its vehicle still idle at the same
+# position, even on ticks where it is not a candidate. `direction` records whether pairs were
+# routed passenger -> vehicle or vehicle -> passenger; a change of direction starts over.
+# Pairs that could not be routed (NaN) are not kept, so they are retried on the next tick.
+class CostMatrixCache:
+
+    def __init__(self):
+        self.direction = None
+        self.pairs = {}     # (passenger ID, vehicle key) -> road distance
+
+        self.computed = 0   # pairs routed
+        self.reused = 0     # pairs served from earlier ticks
+
+    # Road distances of the arcs (passenger_ids[p_idx], vehicle_keys[v_idx]); compute(arcs) returns
+    # the distances of the arcs at the given positions
+    def get(self, passenger_ids, vehicle_keys, p_idx, v_idx, direction, compute):
+        if direction != self.direction:
+            self.direction, self.pairs = direction, {}
+
+        keys = [(passenger_ids[p], vehicle_keys[v]) for p, v in zip(p_idx.tolist(), v_idx.tolist())]
+        distances = np.array([self.pairs.get(key, np.nan) for key in keys], dtype=np.float64)
+        missing = np.flatnonzero(np.isnan(distances))
+        if len(missing) > 0:
+            distances[missing] = compute(missing)
+
+        self.reused += len(keys) - len(missing)
+        self.computed += len(missing)
+
+        # Drop pairs whose passenger was matched or failed, or whose vehicle left or moved
+        passengers, vehicles = set(passenger_ids), set(vehicle_keys)
+        self.pairs = {
+            key: value for key, value in self.pairs.items() if key[0] in passengers and key[1] in vehicles
+        }
+        self.pairs.update((keys[arc], value) for arc, value in zip(missing.tolist(), distances[missing].tolist())
+                          if value == value)  # skip NaN
+        return distances
+
+    def stats(self):
+        return {'computed': self.computed, 'reused': self.reused}
@@ -0,0 +1,233 @@
+import heapq
+import itertools
+import numpy as np
+import pandas as pd
+
+
+# Passenger fields carried by a vehicle while it is dispatched or in service
+VEHICLE_PASSENGER_FIELDS = [
+    'P_ID', 'P_ride_lat', 'P_ride_lon', 'P_alight_lat', 'P_alight_lon',
+    'P_request_time', 'P_disembark_time'
+]
+
+
+# Column dtypes for idle/active vehicle tables derived from the input vehicles and passengers
+def vehicle_state_dtypes(vehicles, passengers):
+    dtypes = {'vehicle_id': vehicles['vehicle_id'].dtype}
+    if 'cartype' in vehicles.columns:
+        dtypes['cartype'] = vehicles['cartype'].dtype
+
+    for col in ['work_end', 'temporary_stopTime', 'lat', 'lon'] + VEHICLE_PASSENGER_FIELDS:
+        dtypes[col] = np.float64
+    dtypes['P_ID'] = passengers['ID'].dtype
+    return dtypes
+
+
+# Value of an empty cell: NaN for float columns, None for object columns, zero (or the
+# empty string) otherwise
+def empty_value(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'O':
+        return None
+    return np.zeros(1, dtype=dtype)[0]
+
+
+# Growable struct-of-arrays table holding one agent population (passengers or vehicles).
+# Rows live in numbered slots; removing rows only clears their slot so that appends and
+# removals cost O(changed rows), and insertion order is preserved for FCFS dispatch.
+# Slot numbers are only stable until the next append (which may compact the table);
+# when a key column is given, rows can also be located by key (e.g. passenger 'ID').
+# With a due column (requires a key), rows are also kept in a min-heap on that column so
+# rows that became due (drop-off time, shift end) are popped without scanning the table.
+class AgentTable:
+
+    def __init__(self, dtypes, capacity=256, key=None, due_col=None):
+        self.dtypes = {col: np.dtype(dt) for col, dt in dtypes.items()}
+        self.columns = list(self.dtypes)
+        self.key = key
+        self._index = {} if key is not None else None
+        self._last = (0, 0)
+
+        # Heap entries are (due time, seq, key); stale entries are skipped lazily
+        self.due_col = due_col
+        self._due = []
+        self._due_seq = {}
+        self._seq = itertools.count()
+
+        capacity = max(int(capacity), 1)
+        self._data = {col: np.empty(capacity, dtype=dt) for col, dt in self.dtypes.items()}
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._end = 0   # high-water mark of used slots
+        self._size = 0  # number of live rows
+
+    # Build a table from a DataFrame, keeping its column dtypes
+    @classmethod
+    def from_frame(cls, frame, dtypes=None, key=None):
+        if dtypes is None:
+            dtypes = {col: frame[col].dtype for col in frame.columns}
+        table = cls(dtypes, capacity=max(len(frame), 256), key=key)
+        table.append(frame)
+        return table
+
+    def __len__(self):
+        return self._size
+
+    # Live slots in insertion order
+    def slots(self):
+        return np.flatnonzero(self._alive[:self._end])
+
+    # Slots of the rows with the given keys (keys no longer in the table are skipped)
+    def locate(self, keys):
+        index = self._index
+        return np.array([index[k] for k in keys if k in index], dtype=np.int64)
+
+    # Pop the slots whose due column is <= bound (< bound when inclusive=False), in slot order.
+    # The due column must not be changed with set() after a row is appended.
+    def pop_due(self, bound, inclusive=True):
+        heap = self._due
+        keys = []
+        while heap and (heap[0][0] <= bound if inclusive else heap[0][0] < bound):
+            _, seq, k = heapq.heappop(heap)
+            if self._due_seq.get(k) == seq:
+                keys.append(k)
+        return np.sort(self.locate(keys))
+
+    # Slots written by the most recent append
+    def last_appended(self):
+        return np.arange(*self._last)
+
+    # Column values for the given slots (all live rows by default)
+    def get(self, col, slots=None):
+        if slots is None:
+            slots = self.slots()
+        return self._data[col][slots]
+
+    # Overwrite column values for the given slots
+    def set(self, col, slots, values):
+        self._data[col][slots] = values
+
+    # Copy the given rows out as a mapping of column -> array
+    def rows(self, slots, columns=None):
+        columns = self.columns if columns is None else columns
+        return {col: self._data[col][slots] for col in columns}
+
+    # Append rows (DataFrame or mapping of column -> array) and return their slots
+    def append(self, rows):
+        if isinstance(rows, pd.DataFrame):
+            n = len(rows)
+            rows = {col: rows[col].to_numpy() for col in self.columns if col in rows.columns}
+        else:
+            n = len(next(iter(rows.values()))) if len(rows) > 0 else 0
+
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+
+        self._reserve(n)
+        start, stop = self._end, self._end + n
+
+        for col in self.columns:
+            if col in rows:
+                self._data[col][start:stop] = rows[col]
+            else:
+                self._data[col][start:stop] = empty_value(self.dtypes[col])
+
+        self._alive[start:stop] = True
+        self._end = stop
+        self._size += n
+        self._last = (start, stop)
+
+        if self.key is not None:
+            keys = self._data[self.key][start:stop].tolist()
+            self._index.update(zip(keys, range(start, stop)))
+
+            if self.due_col is not None:
+                for due, k in zip(self._data[self.due_col][start:stop].tolist(), keys):
+                    if due == due:  # skip NaN
+                        seq = next(self._seq)
+                        self._due_seq[k] = seq
+                        heapq.heappush(self._due, (due, seq, k))
+        return np.arange(start, stop)
+
+    # Drop the given live slots
+    def remove(self, slots):
+        slots = np.asarray(slots, dtype=np.int64)
+        if len(slots) == 0:
+            return
+
+        if self.key is not None:
+            for k in self._data[self.key][slots].tolist():
+                del self._index[k]
+                self._due_seq.pop(k, None)
+
+        self._alive[slots] = False
+        self._size -= len(slots)
+        if self._size == 0:
+            self._end = 0
+
+    # Copy the given rows out and drop them from the table
+    def take(self, slots, columns=None):
+        rows = self.rows(slots, columns)
+        self.remove(slots)
+        return rows
+
+    # DataFrame view of the given slots (all live rows by default)
+    def to_frame(self, slots=None, columns=None):
+        if slots is None:
+            slots = self.slots()
+        return pd.DataFrame(self.rows(slots, columns))
+
+    # Make room for n more rows, compacting dead slots or doubling capacity
+    def _reserve(self, n):
+        capacity = len(self._alive)
+        if self._end + n <= capacity:
+            return
+
+        live = self.slots()
+        if self._size + n > capacity // 2:
+            capacity = max(capacity * 2, self._size + n)
+
+        for col, dt in self.dtypes.items():
+            data = np.empty(capacity, dtype=dt)
+            data[:self._size] = self._data[col][live]
+            self._data[col] = data
+
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:self._size] = True
+        self._end = self._size
+
+        if self.key is not None:
+            self._index = dict(zip(self._data[self.key][:self._size].tolist(), range(self._size)))
+
+
+# Agents not yet released into the simulation (passenger requests, vehicle shift starts).
+# Rows are sorted once by release time and indexed by cohort offsets, so releasing the
+# agents due at a tick is an O(log T + k) binary search and slice instead of a full scan.
+class ReleaseQueue:
+
+    def __init__(self, frame, time_col):
+        order = np.argsort(frame[time_col].to_numpy(), kind='stable')
+        self.columns = list(frame.columns)
+        self._data = {col: frame[col].to_numpy()[order] for col in self.columns}
+
+        # Offset index: distinct release times and the first row of each cohort
+        self.release_times, offsets = np.unique(self._data[time_col], return_index=True)
+        self._offsets = np.append(offsets, len(order))
+        self._cohort = 0  # next cohort to release
+
+    def __len__(self):
+        return int(self._offsets[-1] - self._offsets[self._cohort])
+
+    # Column values of the rows not yet released
+    def get(self, col):
+        return self._data[col][self._offsets[self._cohort]:]
+
+    # Release every cohort due at or before time as one contiguous slice
+    def release(self, time):
+        stop = int(np.searchsorted(self.release_times, time, side='right'))
+        stop = max(stop, self._cohort)
+
+        lo, hi = self._offsets[self._cohort], self._offsets[stop]
+        self._cohort = stop
+        return {col: values[lo:hi] for col, values in self._data.items()}
@@ -19,7 +19,43 @@ base_configs = {
     'eta_model': None,                   # ETA prediction model (None if unavailable)
     'corp_priv_split': (0.55, 0.45),    # Corporate:Private taxi ratio
     'filter_out_of_region': False,       # Filter out-of-region data
-    'view_operation_graph': True         # Display operation graph
+    'view_operation_graph': True,        # Display operation graph
+    'simulation_kernel': 'minute',       # 'minute' (scan every minute) or 'event' (jump to next event)
+    'time_step': 1,                      # Event kernel tick resolution in minutes (e.g. 0.25 for sub-minute)
+    'output_flush_every': 5000,          # Buffered trip/marker records per output file before appending to disk
+    'async_output': False,               # Build/serialize output records on a background writer thread
+    'output_queue_size': 64,             # Max pending writes before the simulation waits for the writer
+    'output_format': 'json',             # 'json' or 'parquet' (columnar trip/marker tables, needs pyarrow)
+    'osrm_url': 'http://router.project-osrm.org',  # OSRM server base URL (e.g. 'http://127.0.0.1:8000')
+    'osrm_timeout': (5, 30),             # OSRM (connect, read) timeout in seconds
+    'osrm_max_retries': 10,              # OSRM connection retries (exponential backoff)
+    'osrm_pool_size': 32,                # Kept-alive OSRM connections (>= concurrent routing workers)
+    'osrm_max_table_size': 100,          # Max locations per OSRM table request (server's --max-table-size)
+    'street_matrix_backend': 'table',    # 'table' (OSRM table service) or 'route' (one route request per pair)
+    'route_cache_size': 10000,           # Routes kept in the in-memory LRU cache (0 disables the cache)
+    'route_cache_precision': 6,          # Decimals OD coordinates are rounded to for cache keys
+    'route_cache_path': None,            # SQLite file to persist routes across runs (None keeps them in memory)
+    'routing_workers': 8,                # Concurrent route requests per tick (1 routes sequentially)
+    'routing_backend': 'osrm',           # 'osrm' (HTTP server), 'graph' (in-process router on a cached OSM graph) or 'detour' (calibrated model)
+    'graph_cache_path': None,            # Cached router graph (.npz or save_mapped directory); default data/etc/<relocation_region>_drive_graph.npz
+    'graph_boundary_path': None,         # Boundary used to download the graph; default data/etc/<relocation_region>_boundary.geojson
+    'graph_landmarks': 16,               # ALT landmarks precomputed for the graph router
+    'haversine_dtype': 'float64',        # Haversine cost matrix precision ('float32' halves memory, ~1 m error)
+    'optimization_solver': 'mip',        # 'mip' (OR-Tools SCIP) or 'min_cost_flow' (OR-Tools min-cost flow assignment)
+    'candidate_k': None,                 # Nearest idle vehicles per passenger in a sparse optimization graph (None = dense matrix)
+    'candidate_radius': None,            # Max straight-line km between candidate pairs (None = no limit)
+    'unmatched_penalty': 1000,           # Cost of leaving a passenger unmatched in the sparse graph (matrix_mode units)
+    'prefilter_k': 5,                    # Straight-line nearest pairs per passenger/vehicle routed by 'prefiltered_street_distance'
+    'prefilter_fill': 'estimate',        # Unrouted cells: 'estimate' (straight line x measured detour) or 'sentinel' (1000 km)
+    'dispatch_window': None,             # Minutes between dispatch rounds (None dispatches at every tick)
+    'dispatch_batch_size': None,         # Run a round early once this many passengers are waiting (None = window only)
+    'cost_matrix_cache': False,          # Keep candidate-graph road distances across ticks and route only new arcs
+    'eta_memo': True,                    # Reuse ETA predictions of repeated OD pairs within a tick
+    'eta_memo_precision': 6,             # Decimal places OD coordinates are rounded to for the ETA memo
+    'precompute_trip_legs': False,       # Route every passenger's trip leg before the run and look it up at dispatch
+    'trip_leg_store_path': None,         # Directory of the trip leg store (None = data/etc/trip_legs/<relocation_region>_<scenario key>)
+    'metrics_only': False,               # Route durations/distances only; trips are saved as two-point legs
+    'detour_model_path': None            # Calibrated DetourModel (JSON) for 'detour_travel_time' / 'detour' (None = 1.3 detour, 30 km/h)
 }
 
 
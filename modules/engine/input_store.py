@@ -0,0 +1,66 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+# Read-only inputs shared by the processes of a sweep. Preprocessed agent tables are kept
+# column by column as .npy files and routing tables (graph router arrays, trip leg stores)
+# as directories next to them, all written once by the parent process. Workers open the
+# store memory-mapped, so every process reads the same page-cache copy instead of holding
+# (or unpickling) its own, and only the rows a run crops out are copied into its state.
+class SharedInputStore:
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+
+    # Empty store at path (the directory is created)
+    @classmethod
+    def create(cls, path):
+        os.makedirs(path, exist_ok=True)
+        store = cls(path, {'tables': {}})
+        store._save_manifest()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            return cls(path, json.load(f))
+
+    def __contains__(self, name):
+        return name in self.manifest['tables']
+
+    # Save a DataFrame (index is not kept) as table `name`; object columns are stored as
+    # fixed-width strings so they can be memory-mapped
+    def add_table(self, name, frame):
+        table_path = self.table_path(name)
+        os.makedirs(table_path, exist_ok=True)
+        columns = []
+        for idx, col in enumerate(frame.columns):
+            values = frame[col].to_numpy()
+            if values.dtype.kind == 'O':
+                values = values.astype(str)
+            np.save(os.path.join(table_path, f'{idx}.npy'), values)
+            columns.append(col)
+
+        self.manifest['tables'][name] = columns
+        self._save_manifest()
+
+    # Table `name` as a DataFrame over read-only memory-mapped columns
+    def table(self, name):
+        table_path = self.table_path(name)
+        columns = self.manifest['tables'][name]
+        return pd.DataFrame({
+            col: np.load(os.path.join(table_path, f'{idx}.npy'), mmap_mode='r')
+            for idx, col in enumerate(columns)
+        }, copy=False)
+
+    # Directory of table `name`, or of routing arrays saved under that name by their owner
+    # (GraphRouter.save_mapped, TripLegStore.build)
+    def table_path(self, name):
+        return os.path.join(self.path, name)
+
+    def _save_manifest(self):
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as f:
+            json.dump(self.manifest, f, indent=2)
@@ -1,40 +1,41 @@
 import os
 import json
+import queue
+import threading
+from itertools import chain
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from IPython.display import clear_output
 
 
-# Generate directory path for saving simulation results
-def generate_path_to_save(result_folder_name=None, additional_path=None):
-    # Create base directory
-    base_path = os.path.join(os.getcwd(), "simul_result") 
-    if not os.path.isdir(base_path):
-        os.mkdir(base_path)
-        
-    # Add additional path if specified
+# Generate directory path for saving simulation results. Folders are claimed with an
+# atomic mkdir, so concurrent runs writing to the same scenario path never share one:
+# a taken name falls back to the next free `<prefix>_<n>`.
+def generate_path_to_save(result_folder_name=None, additional_path=None, prefix='simulation'):
+    # Create base directory (and the additional path if specified)
+    base_path = os.path.join(os.getcwd(), "simul_result")
     if additional_path is not None:
         base_path = os.path.join(base_path, additional_path)
-        if not os.path.isdir(base_path):
-            os.mkdir(base_path)
-    
-    # Create result folder with unique name
+    os.makedirs(base_path, exist_ok=True)
+
+    # Create result folder with the requested name if it is free
     if result_folder_name is not None:
-        if result_folder_name not in os.listdir(base_path):
-            base_path = os.path.join(base_path, result_folder_name)
-            os.mkdir(base_path)
-        else:
-            # Generate unique folder name if exists
-            result_folder_name = f"simulation_{len(os.listdir(base_path)) + 1}"
-            base_path = os.path.join(base_path, result_folder_name)
-            os.mkdir(base_path)
-    else:
-        # Auto-generate folder name
-        result_folder_name = f"simulation_{len(os.listdir(base_path)) + 1}"
-        base_path = os.path.join(base_path, result_folder_name)
-        os.mkdir(base_path)
-        
-    return base_path
+        try:
+            os.mkdir(os.path.join(base_path, result_folder_name))
+            return os.path.join(base_path, result_folder_name)
+        except FileExistsError:
+            pass
+
+    # Auto-generate folder name, moving on while other runs hold the number
+    number = len(os.listdir(base_path)) + 1
+    while True:
+        path = os.path.join(base_path, f"{prefix}_{number}")
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            number += 1
 
 
 # Save data to JSON file (append if exists)
@@ -56,9 +57,304 @@ def save_json_data(current_data, save_path, file_name):
             json.dump(current_data, f)    
 
 
+# Buffered append-only writer for the per-record outputs (trip, passenger/vehicle markers).
+# Records are appended to <file_name>.ndjson and flushed every flush_every records, so a
+# write costs O(new records) instead of re-reading and re-writing the whole JSON file.
+# finalize() streams the NDJSON files into the JSON array files the dashboard reads, or
+# into columnar Parquet tables with output_format='parquet' (see records_to_arrow).
+#
+# With async_io=True, writes go through a bounded queue drained by a writer thread, which
+# also builds the records (when given a callable) and serializes them. A full queue blocks
+# the simulation (back-pressure), and a writer error is re-raised on the next write/close.
+class ResultSink:
+
+    def __init__(self, save_path, flush_every=5000, async_io=False, queue_size=64, output_format='json'):
+        if output_format not in ('json', 'parquet'):
+            raise ValueError(f"Unknown output_format: {output_format}")
+        if output_format == 'parquet':
+            import_pyarrow()  # fail before the run rather than when it finishes
+
+        self.save_path = save_path
+        self.flush_every = flush_every
+        self.output_format = output_format
+        self._buffers = {}
+        self._files = {}
+
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if async_io:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._drain, name='result-sink', daemon=True)
+            self._thread.start()
+
+    # Queue records (a list, or a callable returning one) for file_name
+    def write(self, file_name, records):
+        if self._queue is None:
+            self._append(file_name, records)
+        else:
+            self._raise_error()
+            self._queue.put((file_name, records))
+
+    # Add records to the file's buffer and flush once the buffer is large enough
+    def _append(self, file_name, records):
+        if callable(records):
+            records = records()
+
+        buffer = self._buffers.setdefault(file_name, [])
+        buffer.extend(records)
+        if len(buffer) >= self.flush_every:
+            self.flush(file_name)
+
+    # Append buffered records to their NDJSON files
+    def flush(self, file_name=None):
+        file_names = list(self._buffers) if file_name is None else [file_name]
+        for name in file_names:
+            buffer = self._buffers.get(name)
+            if not buffer:
+                continue
+
+            f = self._files.get(name)
+            if f is None:
+                f = self._files[name] = open(f'{self.save_path}/{name}.ndjson', 'a')
+            f.write(''.join(json.dumps(record) + '\n' for record in buffer))
+            buffer.clear()
+
+    # Writer thread loop; after an error, remaining items are dropped so writers never block
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._append(*item)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"Result writer failed for {self.save_path}") from self._error
+
+    # Wait for queued writes, then flush and close every file
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+        self.flush()
+        for f in self._files.values():
+            f.close()
+
+    # Convert every NDJSON file to the JSON array format (same layout as json.dump)
+    # or to a Parquet table
+    def finalize(self, keep_ndjson=False):
+        self.close()
+        for name in self._files:
+            ndjson_path = f'{self.save_path}/{name}.ndjson'
+            if self.output_format == 'parquet':
+                ndjson_to_parquet(ndjson_path, f'{self.save_path}/{name}.parquet')
+                if not keep_ndjson:
+                    os.remove(ndjson_path)
+                continue
+
+            with open(ndjson_path, 'r') as src, open(f'{self.save_path}/{name}.json', 'w') as dst:
+                dst.write('[')
+                for idx, line in enumerate(src):
+                    if idx > 0:
+                        dst.write(', ')
+                    dst.write(line.rstrip('\n'))
+                dst.write(']')
+
+            if not keep_ndjson:
+                os.remove(ndjson_path)
+        self._files = {}
+
+
+# Import pyarrow, which is only needed for output_format='parquet'
+def import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "output_format='parquet' requires pyarrow (pip install pyarrow); "
+            "use output_format='json' otherwise"
+        ) from e
+    return pa, pq
+
+
+# Flatten a list-of-lists column into (offsets, flat float64 values)
+def flatten_lists(values_per_row, width=1):
+    lengths = np.fromiter((len(v) for v in values_per_row), dtype=np.int32, count=len(values_per_row))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+
+    items = chain.from_iterable(values_per_row)
+    if width > 1:
+        items = chain.from_iterable(items)
+    values = np.fromiter(items, dtype=np.float64, count=int(offsets[-1]) * width)
+    return offsets, values.reshape(-1, width) if width > 1 else values
+
+
+# First and last value of each flattened row (NaN for empty rows)
+def list_ends(offsets, values):
+    first, last = np.full(len(offsets) - 1, np.nan), np.full(len(offsets) - 1, np.nan)
+    non_empty = offsets[1:] > offsets[:-1]
+    first[non_empty] = values[offsets[:-1][non_empty]]
+    last[non_empty] = values[offsets[1:][non_empty] - 1]
+    return first, last
+
+
+# Columnar layout of trip/marker records:
+# - 'timestamp' -> list<double> 'timestamp' plus scalar 'start_time'/'end_time' (first/last)
+# - 'trip' ([[lon, lat], ...]) -> list<double> 'trip_lon'/'trip_lat' plus scalar
+#   'start_lon'/'start_lat'/'end_lon'/'end_lat' (route endpoints)
+# - 'location' ([lon, lat]) -> scalar 'lon'/'lat'
+# - other fields are stored as scalar columns
+# List columns are Arrow list arrays, i.e. one flat values buffer plus row offsets.
+def records_to_arrow(pa, records):
+    columns = {}
+    for field in records[0]:
+        values = [record[field] for record in records]
+
+        if field == 'timestamp':
+            offsets, flat = flatten_lists(values)
+            columns['timestamp'] = pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat))
+            columns['start_time'], columns['end_time'] = (pa.array(v) for v in list_ends(offsets, flat))
+        elif field == 'trip':
+            offsets, coords = flatten_lists(values, width=2)
+            for idx, axis in enumerate(['lon', 'lat']):
+                flat = np.ascontiguousarray(coords[:, idx])
+                columns[f'trip_{axis}'] = pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat))
+                columns[f'start_{axis}'], columns[f'end_{axis}'] = (pa.array(v) for v in list_ends(offsets, flat))
+        elif field == 'location':
+            location = np.array(values, dtype=np.float64).reshape(-1, 2)
+            columns['lon'] = pa.array(location[:, 0])
+            columns['lat'] = pa.array(location[:, 1])
+        else:
+            columns[field] = pa.array(values)
+
+    return pa.table(columns)
+
+
+# Stream an NDJSON record file into a Parquet table, batch_size records at a time
+def ndjson_to_parquet(ndjson_path, parquet_path, batch_size=100000):
+    pa, pq = import_pyarrow()
+    writer = None
+
+    def write_batch(batch):
+        nonlocal writer
+        table = records_to_arrow(pa, batch)
+        if writer is None:
+            writer = pq.ParquetWriter(parquet_path, table.schema)
+        writer.write_table(table.cast(writer.schema))
+
+    try:
+        batch = []
+        with open(ndjson_path, 'r') as f:
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    write_batch(batch)
+                    batch = []
+        if batch:
+            write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# Load a result table (trip, passenger_marker, vehicle_marker) from a simulation folder.
+# <file_name>.parquet is preferred (reading only the stored columns behind the requested
+# ones), with <file_name>.json as fallback. Both formats expose the original fields and the
+# derived 'start_time'/'end_time', 'lon'/'lat' and 'start_lon'/.../'end_lat' columns.
+def load_result_table(result_folder, file_name, columns=None):
+    parquet_path = os.path.join(result_folder, f'{file_name}.parquet')
+    if os.path.isfile(parquet_path):
+        return load_parquet_table(parquet_path, columns)
+
+    data = pd.read_json(os.path.join(result_folder, f'{file_name}.json'))
+    derived = ['start_time', 'end_time', 'lon', 'lat', 'start_lon', 'start_lat', 'end_lon', 'end_lat']
+    wanted = data.columns.tolist() + derived if columns is None else columns
+
+    if 'timestamp' in data.columns:
+        if 'start_time' in wanted:
+            data['start_time'] = [ts[0] for ts in data['timestamp']]
+        if 'end_time' in wanted:
+            data['end_time'] = [ts[-1] for ts in data['timestamp']]
+    if 'location' in data.columns:
+        if 'lon' in wanted:
+            data['lon'] = [loc[0] for loc in data['location']]
+        if 'lat' in wanted:
+            data['lat'] = [loc[1] for loc in data['location']]
+    if 'trip' in data.columns:
+        for col, idx, coord in (('start_lon', 0, 0), ('start_lat', 0, 1), ('end_lon', -1, 0), ('end_lat', -1, 1)):
+            if col in wanted:
+                data[col] = [tp[idx][coord] for tp in data['trip']]
+
+    return data if columns is None else data[columns]
+
+
+# Read a Parquet result table, rebuilding the nested 'trip'/'location' columns on request
+def load_parquet_table(parquet_path, columns=None):
+    pa, pq = import_pyarrow()
+    nested = {'trip': ['trip_lon', 'trip_lat'], 'location': ['lon', 'lat']}
+
+    if columns is None:
+        table = pq.read_table(parquet_path)
+        stored = table.column_names
+        columns = [col for col in stored if col not in ('trip_lon', 'trip_lat')]
+        if 'trip_lon' in stored:
+            columns.append('trip')
+        if 'lon' in stored:
+            columns.append('location')
+    else:
+        stored = list(dict.fromkeys(chain.from_iterable(nested.get(col, [col]) for col in columns)))
+        table = pq.read_table(parquet_path, columns=stored)
+
+    data = {}
+    for col in columns:
+        if col == 'trip':
+            lon, lat = (list_column_values(table.column(c)) for c in nested['trip'])
+            data[col] = [np.column_stack([x, y]).tolist() for x, y in zip(lon, lat)]
+        elif col == 'location':
+            data[col] = np.column_stack([table.column('lon').to_numpy(), table.column('lat').to_numpy()]).tolist()
+        elif col == 'timestamp':
+            data[col] = [ts.tolist() for ts in list_column_values(table.column(col))]
+        else:
+            data[col] = table.column(col).to_pandas()
+
+    return pd.DataFrame(data, columns=columns)
+
+
+# Split an Arrow list column into one numpy array per row using its offsets
+def list_column_values(column):
+    array = column.combine_chunks()
+    if len(array) == 0:
+        return []
+    offsets = array.offsets.to_numpy()
+    values = array.flatten().to_numpy()
+    return np.split(values, offsets[1:-1] - offsets[0])
+
+
+# Write records (or a callable building them) through the run's result sink
+# (rewrites the JSON file when there is none)
+def save_result_records(records, simul_configs, file_name):
+    sink = simul_configs.get('result_sink')
+    if sink is None:
+        save_json_data(records() if callable(records) else records, simul_configs['save_path'], file_name)
+    else:
+        sink.write(file_name, records)
+
+
 # Track and visualize simulation progress
 def checking_progress(simulation_record, current_time, requested_passenger, 
-                     fail_passenger, empty_vehicle, active_vehicle, inform):
+                     fail_passenger, empty_vehicle, active_vehicle, inform, dispatch_stats=None):
     
     time_range = inform['time_range']
     save_path = inform['save_path']
@@ -72,6 +368,10 @@ def checking_progress(simulation_record, current_time, requested_passenger,
         'driving_vehicle_cnt': [len(active_vehicle)]
     })
 
+    # Cumulative dispatch rounds, matched passengers and their mean wait (DispatchWindow.stats)
+    for col, value in (dispatch_stats or {}).items():
+        current_record[col] = [value]
+
     simulation_record = pd.concat([simulation_record, current_record]).reset_index(drop=True)
 
     # Display operation graph
@@ -101,4 +401,27 @@ def checking_progress(simulation_record, current_time, requested_passenger,
     if current_time == (time_range[-1] - 1):
         simulation_record.to_csv(f'{save_path}/record.csv', index=False)
     
-    return simulation_record
\ No newline at end of file
+    return simulation_record
+
+
+# Save the simulation record with one row per simulated minute
+# (the event-driven kernel only records ticks where something happened)
+def save_simulation_record(simulation_record, inform):
+    start_time, end_time = inform['time_range']
+    count_cols = ['waiting_passenger_cnt', 'fail_passenger_cnt', 'empty_vehicle_cnt', 'driving_vehicle_cnt']
+    count_cols += [col for col in ['dispatch_round_cnt', 'dispatched_passenger_cnt'] if col in simulation_record]
+
+    record = simulation_record.drop_duplicates('time', keep='last').sort_values('time')
+    record['time'] = record['time'].astype(float)
+
+    minutes = pd.DataFrame({'time': np.arange(start_time, end_time, dtype=float)})
+    record = pd.merge_asof(minutes, record, on='time', direction='backward')
+
+    # Minutes before the first event keep the empty initial state
+    record[count_cols] = record[count_cols].fillna(0).astype(int)
+    if 'mean_dispatch_wait' in record:
+        record['mean_dispatch_wait'] = record['mean_dispatch_wait'].fillna(0.0)
+    record['time'] = record['time'].astype(int)
+
+    record.to_csv(f"{inform['save_path']}/record.csv", index=False)
+    return record
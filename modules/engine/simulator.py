@@ -1,19 +1,37 @@
+import os
 from typing import NoReturn
+import numpy as np
 import pandas as pd 
 from tqdm import tqdm
 
 from .config_manager import extract_selector, dispatch_selector, base_configs
-from .state_updater import update_passenger, update_vehicle
-from .io_manager import generate_path_to_save, save_json_data, checking_progress
+from .agent_store import AgentTable, ReleaseQueue, vehicle_state_dtypes
+from .event_queue import (EventQueue, PASSENGER_FAIL, PASSENGER_REQUEST, VEHICLE_START,
+                          VEHICLE_DROPOFF, VEHICLE_SHIFT_END, DISPATCH_WINDOW)
+from .state_updater import update_passenger, update_vehicle, fail_passengers
+from .io_manager import generate_path_to_save, checking_progress, save_simulation_record, ResultSink
 from ..preprocess.data_preprocessor import crop_data_by_timerange, get_preprocessed_data
+from ..routing.osrm_client import OSRMClient, set_osrm_client, set_offline_router, get_route_cache, set_route_cache
+from ..routing.graph_router import GraphRouter
+from ..routing.route_cache import RouteCache
+from ..routing.leg_store import TripLegStore
+from ..routing.detour_model import DetourModel
+from ..dispatch.dispatch_window import DispatchWindow
+from ..dispatch.matrix_cache import CostMatrixCache
+from ..dispatch.eta_inference import ETAPredictor
 
 
-# Initialize simulation base dataframes
-def base_data():
-    active_vehicle = pd.DataFrame()
-    empty_vehicle = pd.DataFrame()
-    requested_passenger = pd.DataFrame()
-    fail_passenger = pd.DataFrame()
+# Initialize simulation state stores (struct-of-arrays tables) and the record frame
+def base_data(passengers, vehicles):
+    passenger_dtypes = {col: passengers[col].dtype for col in passengers.columns}
+    passenger_dtypes['dispatch_time'] = np.float64
+    vehicle_dtypes = vehicle_state_dtypes(vehicles, passengers)
+
+    # In-service vehicles are scheduled on drop-off time, idle vehicles on shift end
+    active_vehicle = AgentTable(vehicle_dtypes, key='vehicle_id', due_col='P_disembark_time')
+    empty_vehicle = AgentTable(vehicle_dtypes, key='vehicle_id', due_col='work_end')
+    requested_passenger = AgentTable(passenger_dtypes, key='ID')
+    fail_passenger = AgentTable(passenger_dtypes)
     
     simulation_record = pd.DataFrame(
                                 columns=[
@@ -22,6 +40,9 @@ def base_data():
                                     'fail_passenger_cnt', 
                                     'empty_vehicle_cnt',
                                     'driving_vehicle_cnt', 
+                                    'dispatch_round_cnt',
+                                    'dispatched_passenger_cnt',
+                                    'mean_dispatch_wait',
                                     'iter_time(second)'
                                 ]
                             )
@@ -29,6 +50,29 @@ def base_data():
     return active_vehicle, empty_vehicle, requested_passenger, fail_passenger, simulation_record
 
 
+# Install the run's routing state: detour model, pooled OSRM client (or offline router)
+# and route cache, shared by every routing call in this process
+def configure_routing(configs):
+    # Calibrated detour/speed model for router-free matrices and legs
+    uses_detour = (configs.get('matrix_mode') == 'detour_travel_time'
+                   or configs.get('routing_backend', 'osrm') == 'detour')
+    configs['detour_model'] = DetourModel.from_configs(configs) if uses_detour else None
+
+    # Routing calls share one pooled OSRM client (or the offline graph router) and route cache
+    osrm_client = set_osrm_client(OSRMClient.from_configs(configs))
+    route_namespace = f'{osrm_client.base_url}/{osrm_client.profile}'
+    if configs.get('routing_backend', 'osrm') == 'graph':
+        router = set_offline_router(GraphRouter.from_configs(configs))
+        route_namespace = f'graph:{os.path.abspath(router.path)}'
+    elif configs.get('routing_backend', 'osrm') == 'detour':
+        # Model estimates are cheaper to recompute than to cache
+        set_offline_router(configs['detour_model'])
+        route_namespace = None
+    else:
+        set_offline_router(None)
+    set_route_cache(RouteCache.from_configs(configs, namespace=route_namespace) if route_namespace else None)
+
+
 class Simulator:
     
     def __init__(self, raw_data=None, passengers=None, vehicles=None, configs=None):
@@ -48,6 +92,19 @@ class Simulator:
         )
         self.configs['save_path'] = path_to_save_data
 
+        # Trip and marker records are streamed to disk through one sink per run
+        self.result_sink = ResultSink(
+            path_to_save_data,
+            flush_every=self.configs.get('output_flush_every', 5000),
+            async_io=self.configs.get('async_output', False),
+            queue_size=self.configs.get('output_queue_size', 64),
+            output_format=self.configs.get('output_format', 'json')
+        )
+        self.configs['result_sink'] = self.result_sink
+
+        # Routing backend and route cache for this run
+        configure_routing(self.configs)
+
         # Store input data
         self.raw_data = raw_data
         self.passengers = passengers
@@ -60,17 +117,39 @@ class Simulator:
         else:
             self.configs['YMD'] = pd.Timestamp('2019-04-09 00:00:00')
         
+        # Batched, memoized ETA model inference (None without a model)
+        self.configs['eta_predictor'] = ETAPredictor.from_configs(self.configs)
+
         # Crop data to simulation time range
         self.passengers, self.vehicles = crop_data_by_timerange(
             self.passengers, self.vehicles, self.configs
         )
             
+        # Trip legs of every passenger are routed once before the run (memory-mapped store)
+        self.configs['trip_leg_store'] = (
+            TripLegStore.from_configs(self.configs, self.passengers)
+            if self.configs.get('precompute_trip_legs', False) else None
+        )
+
         # Initialize simulation state variables
         (self.active_vehicle, self.empty_vehicle, self.requested_passenger, 
-         self.fail_passenger, self.simulation_record) = base_data()
+         self.fail_passenger, self.simulation_record) = base_data(self.passengers, self.vehicles)
+
+        # Road distances of candidate arcs are carried over between dispatch ticks
+        self.configs['matrix_cache'] = CostMatrixCache() if self.configs.get('cost_matrix_cache', False) else None
+
+        # Dispatch rounds run at every tick or once per batching window
+        self.dispatch_window = DispatchWindow.from_configs(self.configs)
+
+        # Agents not yet released into the simulation, sorted once by release time
+        self.passengers = ReleaseQueue(self.passengers, 'ride_time')
+        self.vehicles = ReleaseQueue(self.vehicles, 'work_start')
     
     # Main simulation execution
     def run(self):
+        if self.configs.get('simulation_kernel', 'minute') == 'event':
+            return self.run_event_driven()
+
         start_time, end_time = self.configs['time_range'][0], self.configs['time_range'][1]
         print(f"- Passengers: {len(self.passengers)}")
         print("\n[SIMULATION]")
@@ -101,14 +180,7 @@ class Simulator:
                 )
 
                 # dispatch
-                if len(self.requested_passenger) > 0 and len(self.empty_vehicle) > 0:
-                    self.requested_passenger, self.active_vehicle, self.empty_vehicle = self.dispatch_main(
-                        self.requested_passenger,
-                        self.active_vehicle,
-                        self.empty_vehicle,
-                        self.configs,
-                        time
-                    )
+                self.dispatch(time)
 
                 # record
                 self.simulation_record = checking_progress(
@@ -117,45 +189,131 @@ class Simulator:
                     self.fail_passenger,
                     self.empty_vehicle,
                     self.active_vehicle,
-                    self.configs
+                    self.configs,
+                    self.dispatch_window.stats()
                 )
 
-                pbar.update(1)   
+                pbar.update(1)
 
-            for time in range(start_time, end_time):
-                # Update passenger status (new requests, failures)
-                self.requested_passenger, self.fail_passenger, self.passengers = update_passenger(
-                    self.requested_passenger, 
-                    self.fail_passenger,  
-                    self.passengers, 
-                    self.configs,
-                    time
-                )
-                
-                # Update vehicle status (active to empty transitions)
-                self.active_vehicle, self.empty_vehicle, self.vehicles = update_vehicle(
-                    self.active_vehicle,
-                    self.empty_vehicle, 
-                    self.vehicles,
-                    self.configs,
-                    time
-                )
-                
-                # Execute dispatch when both requests and vehicles available
-                if (len(self.requested_passenger) > 0) and (len(self.empty_vehicle) > 0):
-                    self.requested_passenger, self.active_vehicle, self.empty_vehicle = self.dispatch_main(
-                        self.requested_passenger, 
-                        self.active_vehicle, 
-                        self.empty_vehicle, 
-                        self.configs, 
-                        time
-                    )
+        self.finish()
+
+    # Discrete-event execution: jump straight to the next tick that has an event
+    def run_event_driven(self):
+        start_time, end_time = self.configs['time_range'][0], self.configs['time_range'][1]
+        print(f"- Passengers: {len(self.passengers)}")
+        print("\n[SIMULATION]")
+        print("Running simulation (event-driven)...")
+
+        events = EventQueue(start_time, self.configs.get('time_step', 1))
+        end_tick = events.tick_of(end_time)
+
+        # Seed the queue with one event per request / shift start / shift end cohort
+        events.push_many(self.passengers.release_times, PASSENGER_REQUEST, [None] * len(self.passengers.release_times))
+        events.push_many(self.vehicles.release_times, VEHICLE_START, [None] * len(self.vehicles.release_times))
+
+        shift_end_times = np.unique(self.vehicles.get('work_end')) - 5
+        events.push_many(shift_end_times, VEHICLE_SHIFT_END, [None] * len(shift_end_times), strict=True)
+
+        window_wakeup = None
+        with tqdm(total=end_time - start_time, desc="simulation", unit="minutes") as pbar:
+            while len(events) > 0 and events.next_tick() < end_tick:
+                tick, current_events = events.pop_tick()
+                time = events.time_of(tick)
+
+                self.apply_events(events, current_events, time)
+
+                # Execute dispatch when a round is due and vehicles are available
+                new_slots = self.dispatch(time)
+
+                # Wake up again when the newly dispatched vehicles drop off
+                if len(new_slots) > 0:
+                    dropoff_times = np.unique(self.active_vehicle.get('P_disembark_time', new_slots))
+                    events.push_many(dropoff_times, VEHICLE_DROPOFF, [None] * len(dropoff_times))
+
+                # Passengers left waiting for the batching window get a wake-up at its end
+                next_round = self.dispatch_window.next_round
+                if len(self.requested_passenger) > 0 and next_round > time and next_round != window_wakeup:
+                    events.push_many([next_round], DISPATCH_WINDOW, [None])
+                    window_wakeup = next_round
 
                 # Record current simulation state
                 self.simulation_record = checking_progress(
-                    self.simulation_record, time, self.requested_passenger, 
-                    self.fail_passenger, self.empty_vehicle, self.active_vehicle, 
-                    self.configs
+                    self.simulation_record, time, self.requested_passenger,
+                    self.fail_passenger, self.empty_vehicle, self.active_vehicle,
+                    self.configs, self.dispatch_window.stats()
                 )
 
-                pbar.update(1)
\ No newline at end of file
+                pbar.update(time - start_time - pbar.n)
+
+            pbar.update(pbar.total - pbar.n)
+
+        # Quiet minutes were skipped, so fill them in before saving record.csv
+        save_simulation_record(self.simulation_record, self.configs)
+        self.finish()
+
+    # Run a dispatch round when the batching window is due; returns the newly dispatched vehicle slots
+    def dispatch(self, time):
+        if len(self.empty_vehicle) == 0 or not self.dispatch_window.due(time, len(self.requested_passenger)):
+            return np.empty(0, dtype=np.int64)
+
+        active_cnt = len(self.active_vehicle)
+        self.requested_passenger, self.active_vehicle, self.empty_vehicle = self.dispatch_main(
+            self.requested_passenger,
+            self.active_vehicle,
+            self.empty_vehicle,
+            self.configs,
+            time
+        )
+
+        new_slots = self.active_vehicle.last_appended() if len(self.active_vehicle) > active_cnt else np.empty(0, dtype=np.int64)
+        self.dispatch_window.close_round(time, self.active_vehicle.get('P_request_time', new_slots))
+        return new_slots
+
+    # Write the trip/marker outputs and persist the route cache at the end of a run
+    def finish(self):
+        # Produce trip.json / passenger_marker.json / vehicle_marker.json
+        self.result_sink.finalize()
+
+        route_cache = get_route_cache()
+        if route_cache is not None:
+            route_cache.flush()
+            print(f"- Route cache: {route_cache.stats()}")
+
+        print(f"- Dispatch: {self.dispatch_window.stats()}")
+        if self.configs.get('trip_leg_store') is not None:
+            print(f"- Trip leg store: {self.configs['trip_leg_store'].stats()}")
+        if self.configs.get('eta_predictor') is not None:
+            print(f"- ETA model: {self.configs['eta_predictor'].stats()}")
+        if self.configs.get('matrix_cache') is not None:
+            print(f"- Cost matrix cache: {self.configs['matrix_cache'].stats()}")
+
+    # Apply one tick's events in the same phase order as update_passenger/update_vehicle
+    def apply_events(self, events, current_events, time):
+        fail_time = self.configs['fail_time']
+
+        # Waiting passengers reaching the fail time
+        slots = self.requested_passenger.locate(current_events.get(PASSENGER_FAIL, []))
+        if len(slots) > 0:
+            slots = np.sort(slots)
+            waited = time - self.requested_passenger.get('ride_time', slots)
+            self.requested_passenger.set('dispatch_time', slots, self.requested_passenger.get('dispatch_time', slots) + waited)
+            fail_passengers(self.requested_passenger, self.fail_passenger, slots, self.configs)
+
+        # New requests join the waiting pool and schedule their fail timeout
+        current_requested_passenger = self.passengers.release(time)
+        if len(current_requested_passenger['ID']) > 0:
+            self.requested_passenger.append(current_requested_passenger)
+            new_slots = self.requested_passenger.last_appended()
+            fail_at = (self.requested_passenger.get('ride_time', new_slots) + fail_time
+                       - self.requested_passenger.get('dispatch_time', new_slots))
+            events.push_many(fail_at, PASSENGER_FAIL, self.requested_passenger.get('ID', new_slots).tolist())
+
+        # Vehicle transitions are the same as in the minute kernel; the drop-off and
+        # work-end heaps only return vehicles that are due, so visiting a tick is cheap
+        self.active_vehicle, self.empty_vehicle, self.vehicles = update_vehicle(
+            self.active_vehicle,
+            self.empty_vehicle,
+            self.vehicles,
+            self.configs,
+            time
+        )
@@ -1,145 +1,133 @@
-import pandas as pd
+from functools import partial
 import numpy as np
 
-from .io_manager import save_json_data
+from .agent_store import VEHICLE_PASSENGER_FIELDS, empty_value
+from .io_manager import save_result_records
+
+
+# Build failed passenger markers from passenger rows
+def fail_passenger_markers(rows):
+    return [
+        {
+            'passenger_id': passenger_id,
+            'status': 0,
+            'location': [lon, lat],
+            'timestamp': [ride_time, ride_time + dispatch_time]
+        }
+        for passenger_id, lon, lat, ride_time, dispatch_time in zip(
+            rows['ID'].tolist(), rows['ride_lon'].tolist(), rows['ride_lat'].tolist(),
+            rows['ride_time'].tolist(), rows['dispatch_time'].tolist()
+        )
+    ]
+
+
+# Build idle-period vehicle markers from vehicle rows
+def vehicle_markers(rows, time):
+    cartypes = rows['cartype'].tolist() if 'cartype' in rows else None
+    markers = []
+    for idx, (vehicle_id, lon, lat, stop_time) in enumerate(zip(
+        rows['vehicle_id'].tolist(), rows['lon'].tolist(), rows['lat'].tolist(), rows['temporary_stopTime'].tolist()
+    )):
+        marker = {'vehicle_id': vehicle_id}
+        if cartypes is not None:
+            marker['cartype'] = cartypes[idx]
+        marker['location'] = [lon, lat]
+        marker['timestamp'] = [stop_time, time]
+        markers.append(marker)
+    return markers
+
+
+# Move waiting passengers past the fail time to the failed pool
+def fail_passengers(requested_passenger, fail_passenger, slots, simul_configs):
+    current_fail_passenger = requested_passenger.take(slots)
+    fail_passenger.append(current_fail_passenger)
+
+    save_result_records(partial(fail_passenger_markers, current_fail_passenger), simul_configs, file_name='passenger_marker')
+
+
+# Put vehicles starting work into the idle pool
+def start_vehicles(empty_vehicle, current_start_vehicle, time):
+    # Passenger fields are left empty (see empty_value) for idle vehicles
+    current_start_vehicle = {
+        col: values for col, values in current_start_vehicle.items()
+        if col in empty_vehicle.columns and col not in VEHICLE_PASSENGER_FIELDS
+    }
+    current_start_vehicle['temporary_stopTime'] = np.full(len(current_start_vehicle['vehicle_id']), time, dtype=np.float64)
+
+    empty_vehicle.append(current_start_vehicle)
+
+
+# Move vehicles that finished their trip to the idle pool at the drop-off point
+def drop_off_vehicles(active_vehicle, empty_vehicle, slots):
+    current_empty_vehicle = active_vehicle.take(slots)
+
+    # Update vehicle location to drop-off point
+    current_empty_vehicle['lat'] = current_empty_vehicle['P_alight_lat']
+    current_empty_vehicle['lon'] = current_empty_vehicle['P_alight_lon']
+    current_empty_vehicle['temporary_stopTime'] = current_empty_vehicle['P_disembark_time']
+
+    # Clear passenger fields
+    for col in ['P_ID', 'P_ride_lat', 'P_ride_lon', 'P_alight_lat', 'P_alight_lon', 'P_disembark_time']:
+        current_empty_vehicle[col] = np.full(len(slots), empty_value(empty_vehicle.dtypes[col]), dtype=empty_vehicle.dtypes[col])
+
+    empty_vehicle.append(current_empty_vehicle)
+
+
+# Remove idle vehicles whose shift is ending and save their markers
+def end_vehicles(empty_vehicle, slots, simul_configs, time):
+    end_vehicle = empty_vehicle.take(slots)
+
+    # Vehicles that only became idle this minute, or never stopped, leave no marker
+    stop_time = end_vehicle['temporary_stopTime']
+    keep = (stop_time != time) & ~np.isnan(stop_time)
+
+    if keep.any():
+        end_vehicle = {col: values[keep] for col, values in end_vehicle.items()}
+        save_result_records(partial(vehicle_markers, end_vehicle, time), simul_configs, file_name='vehicle_marker')
 
 
 # Update passenger status (new requests, failures)
 def update_passenger(requested_passenger, fail_passenger, passenger, simul_configs, time):
     fail_time = simul_configs['fail_time']
-    save_path = simul_configs['save_path']
-    
+
     # Extract passengers requesting at current time
-    current_requested_passenger = passenger[passenger['ride_time'] == time]
-    passenger = passenger[passenger['ride_time'] != time].reset_index(drop=True)
-    
+    current_requested_passenger = passenger.release(time)
+
     if len(requested_passenger) > 0:
         # Increment dispatch waiting time
-        requested_passenger['dispatch_time'] = requested_passenger['dispatch_time'] + 1
-        
+        slots = requested_passenger.slots()
+        dispatch_time = requested_passenger.get('dispatch_time', slots) + 1
+        requested_passenger.set('dispatch_time', slots, dispatch_time)
+
         # Move passengers exceeding fail time to failed status
-        current_fail_passenger = requested_passenger[requested_passenger['dispatch_time'] >= fail_time]
-        fail_passenger = pd.concat([fail_passenger, current_fail_passenger])
-        fail_passenger = fail_passenger.reset_index(drop=True)
-        
-        if len(current_fail_passenger) > 0:
-            # Keep only passengers under fail time threshold
-            requested_passenger = requested_passenger[requested_passenger['dispatch_time'] < fail_time]
-            
-            # Save failed passenger markers
-            current_fail_passenger = [
-                {
-                    'passenger_id': row['ID'], 
-                    'status': 0,
-                    'location': [row['ride_lon'], row['ride_lat']], 
-                    'timestamp': [row['ride_time'], row['ride_time'] + row['dispatch_time']]
-                }
-                for _, row in current_fail_passenger.iterrows()
-            ]
-            
-            save_json_data(current_fail_passenger, save_path, file_name='passenger_marker')
-            del current_fail_passenger
-    
+        fail_slots = slots[dispatch_time >= fail_time]
+        if len(fail_slots) > 0:
+            fail_passengers(requested_passenger, fail_passenger, fail_slots, simul_configs)
+
     # Add new requests to active passenger pool
-    requested_passenger = pd.concat([requested_passenger, current_requested_passenger])
-    requested_passenger = requested_passenger.reset_index(drop=True)
-    
+    requested_passenger.append(current_requested_passenger)
+
     return requested_passenger, fail_passenger, passenger
 
 
 # Update vehicle status (work start, passenger drop-off, work end)
 def update_vehicle(active_vehicle, empty_vehicle, vehicle, simul_configs, time):
-    save_path = simul_configs['save_path']
-    
+
     # Process vehicles starting work
-    current_start_vehicle = vehicle[vehicle['work_start'] == time]
-    
-    if len(current_start_vehicle) > 0:
-        # Select columns based on available data
-        if 'cartype' in current_start_vehicle.columns:
-            current_start_vehicle = current_start_vehicle[[
-                'vehicle_id', 'cartype', 'work_end', 'temporary_stopTime', 'lat', 'lon'
-            ]]
-        else:
-            current_start_vehicle = current_start_vehicle[[
-                'vehicle_id', 'work_end', 'temporary_stopTime', 'lat', 'lon'
-            ]]
-        
-        # Initialize passenger fields for empty vehicles
-        current_start_vehicle['temporary_stopTime'] = time
-        current_start_vehicle['P_ID'] = np.nan
-        current_start_vehicle['P_ride_lat'] = np.nan
-        current_start_vehicle['P_ride_lon'] = np.nan
-        current_start_vehicle['P_alight_lat'] = np.nan
-        current_start_vehicle['P_alight_lon'] = np.nan
-        current_start_vehicle['P_request_time'] = np.nan
-        current_start_vehicle['P_disembark_time'] = np.nan
-        
-        empty_vehicle = pd.concat([empty_vehicle, current_start_vehicle])
-        empty_vehicle = empty_vehicle.reset_index(drop=True)
-        
-        # Remove started vehicles from pending pool
-        vehicle = vehicle[vehicle['work_start'] != time].reset_index(drop=True)
-        
-    # Process passenger drop-offs
+    current_start_vehicle = vehicle.release(time)
+    if len(current_start_vehicle['vehicle_id']) > 0:
+        start_vehicles(empty_vehicle, current_start_vehicle, time)
+
+    # Process passenger drop-offs (popped from the disembark-time heap)
     if len(active_vehicle) > 0:
-        current_empty_vehicle = active_vehicle[active_vehicle['P_disembark_time'] <= time].copy()
-        
-        if len(current_empty_vehicle) > 0:
-            # Update vehicle location to drop-off point
-            current_empty_vehicle['lat'] = current_empty_vehicle['P_alight_lat']
-            current_empty_vehicle['lon'] = current_empty_vehicle['P_alight_lon']
-            current_empty_vehicle['temporary_stopTime'] = current_empty_vehicle['P_disembark_time']
-            
-            # Clear passenger fields
-            current_empty_vehicle['P_ID'] = np.nan
-            current_empty_vehicle['P_ride_lat'] = np.nan
-            current_empty_vehicle['P_ride_lon'] = np.nan
-            current_empty_vehicle['P_alight_lat'] = np.nan
-            current_empty_vehicle['P_alight_lon'] = np.nan
-            current_empty_vehicle['P_disembark_time'] = np.nan
-        
-            empty_vehicle = pd.concat([empty_vehicle, current_empty_vehicle])
-            empty_vehicle = empty_vehicle.reset_index(drop=True)
-            
-            # Keep only vehicles still in transit
-            active_vehicle = active_vehicle[active_vehicle['P_disembark_time'] > time]
-            active_vehicle = active_vehicle.reset_index(drop=True)
-            
-    # Process vehicles ending work
+        dropoff_slots = active_vehicle.pop_due(time)
+        if len(dropoff_slots) > 0:
+            drop_off_vehicles(active_vehicle, empty_vehicle, dropoff_slots)
+
+    # Process vehicles ending work (within 5 minutes of work end, popped from the work-end heap)
     if len(empty_vehicle) > 0:
-        # Find vehicles approaching work end (within 5 minutes)
-        end_vehicle = empty_vehicle[empty_vehicle['work_end'] < time + 5]
-        end_vehicle = end_vehicle[end_vehicle['temporary_stopTime'] != time]
-    
-        empty_vehicle = empty_vehicle[empty_vehicle['work_end'] >= time + 5]
-        empty_vehicle = empty_vehicle.reset_index(drop=True)
-        
-        if len(end_vehicle) > 0:
-            # Save vehicle markers (excluding NaN stopTime cases)
-            if 'cartype' in current_start_vehicle.columns:
-                end_vehicle = [
-                    {
-                        'vehicle_id': row['vehicle_id'], 
-                        'cartype': row['cartype'],
-                        'location': [row['lon'], row['lat']], 
-                        'timestamp': [row['temporary_stopTime'], time]
-                    }
-                    for _, row in end_vehicle.iterrows() 
-                    if not np.isnan(row['temporary_stopTime'])
-                ]
-            else:
-                end_vehicle = [
-                    {
-                        'vehicle_id': row['vehicle_id'],
-                        'location': [row['lon'], row['lat']], 
-                        'timestamp': [row['temporary_stopTime'], time]
-                    }
-                    for _, row in end_vehicle.iterrows() 
-                    if not np.isnan(row['temporary_stopTime'])
-                ]
-            
-            save_json_data(end_vehicle, save_path, file_name='vehicle_marker')
-            del end_vehicle
-    
-    return active_vehicle, empty_vehicle, vehicle
\ No newline at end of file
+        end_slots = empty_vehicle.pop_due(time + 5, inclusive=False)
+        if len(end_slots) > 0:
+            end_vehicles(empty_vehicle, end_slots, simul_configs, time)
+
+    return active_vehicle, empty_vehicle, vehicle
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import random
+import itertools
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from multiprocess import Pool
+from tqdm import tqdm
+
+from .simulator import Simulator, configure_routing
+from .io_manager import generate_path_to_save, load_result_table
+from .input_store import SharedInputStore
+from ..preprocess.data_preprocessor import get_preprocessed_data
+from ..routing.osrm_client import get_route_cache
+from ..routing.graph_router import GraphRouter
+from ..routing.leg_store import TripLegStore, TRIP_LEG_KEYS
+
+
+# Scenario fields that select the fleet instead of overriding simul_configs
+FLEET_KEYS = ('num_taxis', 'use_shift', 'seed')
+
+# Config keys get_preprocessed_data depends on (each distinct fleet/value set is prepared once)
+PREPROCESS_KEYS = ('filter_out_of_region', 'relocation_region')
+
+# Shared input store and configs of the sweep, set once per worker process
+_sweep_inputs = {}
+
+
+# Every combination of the grid values ({key: [values, ...]}), repeated once per seed
+def expand_grid(grid, seeds=(None,)):
+    keys = list(grid)
+    return [
+        dict(zip(keys, values), seed=seed)
+        for values in itertools.product(*(grid[key] for key in keys))
+        for seed in seeds
+    ]
+
+
+# Key of the fleet a scenario runs with (see run_sweep)
+def fleet_key(scenario):
+    return tuple(scenario.get(key) for key in FLEET_KEYS)
+
+
+# Run scenarios (dicts of simul_configs overrides plus FLEET_KEYS fields) across a process
+# pool. `vehicles` is one DataFrame (cut to each scenario's num_taxis) or a dict of
+# DataFrames by fleet_key. The parent preprocesses the inputs once into a SharedInputStore
+# (see prepare_shared_inputs) and workers attach to it read-only. Runs write to
+# simulation_<n> folders of a new sweep folder under simul_result/<additional_path>, with
+# their console output in logs/. A row per run is appended to sweep_summary.csv as runs
+# finish; a failed run is recorded with its error and the sweep carries on.
+def run_sweep(scenarios, passengers, vehicles, simul_configs, workers=4, sweep_name=None):
+    unknown = {key for scenario in scenarios for key in scenario} - set(simul_configs) - set(FLEET_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown sweep keys: {sorted(unknown)}")
+
+    sweep_name = sweep_name or f"sweep_{datetime.now():%Y%m%d_%H%M%S}"
+    sweep_path = generate_path_to_save(sweep_name, simul_configs.get('additional_path'), prefix='sweep')
+    os.makedirs(os.path.join(sweep_path, 'logs'), exist_ok=True)
+    summary_path = os.path.join(sweep_path, 'sweep_summary.csv')
+    print(f"- Sweep: {len(scenarios)} runs, {workers} workers -> {sweep_path}")
+
+    store = SharedInputStore.create(os.path.join(sweep_path, 'inputs'))
+    tasks = prepare_shared_inputs(store, scenarios, passengers, vehicles, simul_configs)
+    init_args = (store.path, simul_configs, sweep_path)
+    rows = []
+
+    def collect(results):
+        for row in tqdm(results, total=len(tasks), desc="sweep", unit="runs"):
+            rows.append(row)
+            summary = pd.DataFrame(rows).sort_values('run_index')
+            summary.to_csv(summary_path, index=False)
+
+    if workers <= 1:
+        init_sweep_worker(*init_args)
+        collect(map(run_scenario, tasks))
+    else:
+        with Pool(processes=workers, initializer=init_sweep_worker, initargs=init_args) as pool:
+            collect(pool.imap_unordered(run_scenario, tasks))
+
+    summary = pd.DataFrame(rows).sort_values('run_index').reset_index(drop=True)
+    print(f"- Sweep summary: {summary_path} ({int((summary['status'] == 'ok').sum())}/{len(summary)} runs ok)")
+    return summary
+
+
+# simul_configs of a scenario
+def scenario_configs(simul_configs, scenario):
+    configs = dict(simul_configs)
+    configs.update({key: value for key, value in scenario.items() if key not in FLEET_KEYS})
+    return configs
+
+
+# Write everything the runs share into the store once, in the parent process: the passenger
+# table, each distinct fleet after get_preprocessed_data (so the region boundary is only
+# read here), the graph router arrays and the trip legs of all passengers for runs that
+# precompute them. Returns one task per scenario: (run index, scenario, fleet table, config
+# overrides pointing the run at the shared routing tables).
+def prepare_shared_inputs(store, scenarios, passengers, vehicles, simul_configs):
+    names = {}
+    tasks = []
+    for idx, scenario in enumerate(scenarios, 1):
+        configs = scenario_configs(simul_configs, scenario)
+        overrides = {}
+
+        key = ('vehicles', fleet_key(scenario), *(configs.get(col) for col in PREPROCESS_KEYS))
+        if key not in names:
+            names[key] = f'vehicles_{len(names)}'
+            fleet = vehicles[fleet_key(scenario)] if isinstance(vehicles, dict) else vehicles
+            if scenario.get('num_taxis') and scenario['num_taxis'] < len(fleet):
+                fleet = fleet.head(scenario['num_taxis']).reset_index(drop=True)
+            prepared_passengers, prepared_vehicles = get_preprocessed_data(passengers, fleet.copy(), configs)
+            if 'passengers' not in store:
+                store.add_table('passengers', prepared_passengers)
+            store.add_table(names[key], prepared_vehicles)
+        fleet_table = names[key]
+
+        if configs.get('routing_backend', 'osrm') == 'graph':
+            key = ('graph', configs.get('graph_cache_path'), configs.get('relocation_region'))
+            if key not in names:
+                names[key] = f'graph_{len(names)}'
+                GraphRouter.from_configs(configs).save_mapped(store.table_path(names[key]))
+            configs['graph_cache_path'] = overrides['graph_cache_path'] = store.table_path(names[key])
+
+        if configs.get('precompute_trip_legs', False) and configs.get('trip_leg_store_path') is None:
+            key = ('trip_legs', *(configs.get(col) for col in TRIP_LEG_KEYS))
+            if key not in names:
+                names[key] = f'trip_legs_{len(names)}'
+                shared = store.table('passengers')
+                configure_routing(configs)
+                TripLegStore.build(
+                    shared['ID'].values, shared[['ride_lat', 'ride_lon', 'alight_lat', 'alight_lon']].values,
+                    store.table_path(names[key]), workers=configs.get('routing_workers', 8),
+                    geometry=not configs.get('metrics_only', False)
+                )
+                if get_route_cache() is not None:
+                    get_route_cache().flush()
+            overrides['trip_leg_store_path'] = store.table_path(names[key])
+
+        tasks.append((idx, scenario, fleet_table, overrides))
+    return tasks
+
+
+# Attach the worker process to the sweep's shared inputs for every run it picks up
+def init_sweep_worker(store_path, simul_configs, sweep_path):
+    _sweep_inputs.update(store=SharedInputStore.open(store_path), simul_configs=simul_configs, sweep_path=sweep_path)
+
+
+# Run one scenario in the current worker and return its summary row
+def run_scenario(task):
+    idx, scenario, fleet_table, overrides = task
+    sweep_path = _sweep_inputs['sweep_path']
+    store = _sweep_inputs['store']
+    run_name = f"simulation_{idx}"
+    row = {'run_index': idx, 'run': run_name, **scenario}
+
+    log_path = os.path.join(sweep_path, 'logs', f'{run_name}.log')
+    with open(log_path, 'w') as log, redirect_stdout(log), redirect_stderr(log):
+        start_time = time.time()
+        try:
+            configs = scenario_configs(_sweep_inputs['simul_configs'], scenario)
+            configs.update(overrides)
+            configs['path'] = run_name
+            configs['additional_path'] = os.path.relpath(sweep_path, os.path.join(os.getcwd(), 'simul_result'))
+            configs['view_operation_graph'] = False
+
+            if scenario.get('seed') is not None:
+                random.seed(scenario['seed'])
+                np.random.seed(scenario['seed'])
+
+            # Inputs were preprocessed by the parent; the simulator crops its own copy
+            vehicles = store.table(fleet_table)
+            simulator = Simulator(passengers=store.table('passengers'), vehicles=vehicles, configs=configs)
+            simulator.run()
+
+            row.update(status='ok', error=None, run_secs=time.time() - start_time, vehicles=len(vehicles))
+            row.update(summarize_run(configs['save_path']))
+            row['save_path'] = configs['save_path']
+        except Exception as e:
+            traceback.print_exc()
+            row.update(status='error', error=f"{type(e).__name__}: {e}", run_secs=time.time() - start_time)
+        finally:
+            sys.stdout.flush()
+
+    return row
+
+
+# Service metrics of a finished run folder for the sweep summary table
+def summarize_run(save_path):
+    passengers = load_run_table(save_path, 'passenger_marker', columns=['status', 'start_time', 'end_time'])
+    trip = load_run_table(save_path, 'trip', columns=['board', 'start_time', 'end_time'])
+    record = pd.read_csv(os.path.join(save_path, 'record.csv'))
+
+    served = passengers.loc[passengers['status'] == 1]
+    wait = served['end_time'] - served['start_time']
+    failed = int((passengers['status'] == 0).sum())
+    waiting = int(record['waiting_passenger_cnt'].iloc[-1]) if len(record) > 0 else 0
+    requests = len(served) + failed + waiting
+    pickup = trip.loc[trip['board'] == 0]
+    ride = trip.loc[trip['board'] == 1]
+
+    return {
+        'requests': requests,
+        'served': len(served),
+        'failed': failed,
+        'waiting_at_end': waiting,
+        'fail_rate': failed / requests if requests > 0 else 0.0,
+        'mean_wait': float(wait.mean()) if len(served) > 0 else np.nan,
+        'p90_wait': float(wait.quantile(0.9)) if len(served) > 0 else np.nan,
+        'mean_pickup_time': float((pickup['end_time'] - pickup['start_time']).mean()) if len(pickup) > 0 else np.nan,
+        'mean_trip_time': float((ride['end_time'] - ride['start_time']).mean()) if len(ride) > 0 else np.nan
+    }
+
+
+# Result table of a finished run; the result sink only creates files that received records,
+# so a table the run never wrote to (e.g. no dispatches) is returned empty
+def load_run_table(save_path, file_name, columns):
+    if not any(os.path.isfile(os.path.join(save_path, f'{file_name}.{ext}')) for ext in ('json', 'parquet')):
+        return pd.DataFrame(columns=columns)
+    return load_result_table(save_path, file_name, columns=columns)
@@ -0,0 +1,162 @@
+import os
+import json
+import numpy as np
+
+from modules.routing.osrm_client import route_many
+from modules.utils.distance_utils import calculate_straight_distance, haversine_matrix
+
+
+# Router-free travel model. Road distance is the straight-line distance times a detour
+# factor that depends on the straight-line distance band (short trips detour relatively
+# more), and travel time is that distance driven at an hour-of-day speed. Both are
+# calibrated offline with fit() from router responses or historical trips, saved as a
+# small JSON file, and evaluated with NumPy over whole OD arrays, so cost matrices and
+# legs cost about as much as the haversine distance and need no network calls.
+# Untrained defaults (detour 1.3, 30 km/h) match the straight-line fallbacks elsewhere.
+class DetourModel:
+
+    BINS = (0, 1, 2, 5, 10)  # lower edges (km) of the straight-line distance bands
+
+    def __init__(self, bins=BINS, detour=None, speed=None, reference_speed=None):
+        self.bins = np.asarray(bins, dtype=np.float64)
+        self.detour = np.full(len(self.bins), 1.3) if detour is None else np.asarray(detour, dtype=np.float64)
+        self.speed = np.full(24, 30.0) if speed is None else np.asarray(speed, dtype=np.float64)  # km/h by hour
+        self.path = None
+
+        # Speed for queries without a time (route/table as offline router)
+        self.reference_speed = float(np.mean(self.speed)) if reference_speed is None else float(reference_speed)
+
+    # Model saved at detour_model_path (the untrained defaults when no path is set)
+    @classmethod
+    def from_configs(cls, simul_configs):
+        path = simul_configs.get('detour_model_path')
+        if path is None:
+            return cls()
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Detour model not found: {path} (calibrate one with DetourModel.fit)")
+        return cls.load(path)
+
+    # Calibrate from OD rows ([ride_lat, ride_lon, alight_lat, alight_lon]) with observed
+    # durations (min) and departure times (min from midnight). With road distances (m),
+    # each band's detour factor is the median road/straight ratio; the speed of each hour is
+    # total road distance over total duration (trips without distances use the fitted
+    # detour). Bands or hours with fewer than min_samples trips take the overall value.
+    @classmethod
+    def fit(cls, OD, duration, depart_time, distance=None, bins=BINS, min_samples=20):
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        duration = np.asarray(duration, dtype=np.float64)
+        hour = (np.asarray(depart_time, dtype=np.float64) // 60).astype(np.int64) % 24
+        straight = calculate_straight_distance(OD[:, 0], OD[:, 1], OD[:, 2], OD[:, 3])
+        model = cls(bins)
+        band = model.band(straight)
+
+        # Very short trips are dominated by snapping and pickup noise
+        valid = np.isfinite(duration) & (duration > 0) & (straight > 0.05)
+
+        if distance is not None:
+            road = np.asarray(distance, dtype=np.float64) / 1000  # Convert to km
+            ratio = road / np.where(straight > 0, straight, np.nan)
+            usable = valid & np.isfinite(ratio) & (ratio > 0)
+            overall = np.median(ratio[usable]) if usable.any() else 1.3
+            for b in range(len(model.bins)):
+                selected = usable & (band == b)
+                model.detour[b] = np.median(ratio[selected]) if selected.sum() >= min_samples else overall
+            road = np.where(np.isfinite(road), road, straight * model.detour[band])
+        else:
+            road = straight * model.detour[band]
+
+        if valid.any():
+            model.reference_speed = road[valid].sum() / (duration[valid].sum() / 60)
+        model.speed[:] = model.reference_speed
+        for h in range(24):
+            selected = valid & (hour == h)
+            if selected.sum() >= min_samples:
+                model.speed[h] = road[selected].sum() / (duration[selected].sum() / 60)
+        return model
+
+    # Calibrate from router responses for a sample of OD rows. The router (e.g. OSRM without
+    # traffic data) has no time of day, so every hour gets the same speed; historical trip
+    # durations (fit) are needed for a time-of-day profile.
+    @classmethod
+    def from_route_sample(cls, OD, max_workers=8, **fit_args):
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        results = route_many(OD.tolist(), max_workers, geometry=False)
+        routed = np.array([rs is not None for rs in results], dtype=bool)
+        duration = np.array([rs['duration'] if rs is not None else np.nan for rs in results])
+        distance = np.array([rs['distance'] if rs is not None else np.nan for rs in results])
+        model = cls.fit(OD[routed], duration[routed], np.zeros(int(routed.sum())), distance[routed], **fit_args)
+        model.speed[:] = model.reference_speed
+        return model
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            params = json.load(f)
+        model = cls(params['bins'], params['detour'], params['speed'], params['reference_speed'])
+        model.path = path
+        return model
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                'bins': self.bins.tolist(), 'detour': self.detour.tolist(),
+                'speed': self.speed.tolist(), 'reference_speed': self.reference_speed
+            }, f, indent=2)
+        self.path = path
+
+    # Distance band of straight-line distances (km)
+    def band(self, straight):
+        return np.clip(np.searchsorted(self.bins, straight, side='right') - 1, 0, len(self.bins) - 1)
+
+    # Speed (km/h) at times in minutes from midnight
+    def speed_at(self, time):
+        return self.speed[(np.asarray(time) // 60).astype(np.int64) % 24]
+
+    # Estimated road distance (km) of OD rows
+    def distance(self, OD):
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        straight = calculate_straight_distance(OD[:, 0], OD[:, 1], OD[:, 2], OD[:, 3])
+        return straight * self.detour[self.band(straight)]
+
+    # Estimated travel time (min) of OD rows departing at time (scalar or one per row)
+    def duration(self, OD, time):
+        return self.distance(OD) / self.speed_at(time) * 60
+
+    # Estimated road distance matrix (km) between [[lat, lon], ...] point sets
+    def distance_matrix(self, A, B, dtype=np.float64):
+        return self._scaled_matrix(A, B, self.detour, dtype)
+
+    # Estimated travel time matrix (min) between point sets at time
+    def duration_matrix(self, A, B, time, dtype=np.float64):
+        return self._scaled_matrix(A, B, self.detour * 60 / self.speed_at(time), dtype)
+
+    # Haversine matrix scaled in place by a per-band factor
+    def _scaled_matrix(self, A, B, factor, dtype):
+        matrix = haversine_matrix(A, B, dtype)
+        matrix *= factor.astype(matrix.dtype)[self.band(matrix)]
+        return matrix
+
+    # Legs for OD rows departing at time in the osrm_routing_machine result format, with
+    # two-point routes and timestamps [0, duration] (0.01 min for zero-length legs)
+    def routes(self, OD, time):
+        return self._legs(OD, self.speed_at(time))
+
+    # Offline router interface (see set_offline_router); queries carry no time, so they use
+    # the reference speed
+    def route(self, OD_coords, geometry=True):
+        return self._legs([OD_coords], self.reference_speed)[0]
+
+    def table(self, sources, destinations):
+        distance = self.distance_matrix(np.asarray(sources, dtype=np.float64), np.asarray(destinations, dtype=np.float64))
+        return distance * 1000, distance / self.reference_speed * 60
+
+    def _legs(self, OD, speed):
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        distance = self.distance(OD)
+        duration = distance / speed * 60
+        duration = np.where(duration > 0, duration, 0.01)
+        return [
+            {'route': [[o_lon, o_lat], [d_lon, d_lat]], 'timestamp': [0, dur], 'duration': dur, 'distance': dist * 1000}
+            for (o_lat, o_lon, d_lat, d_lon), dur, dist in zip(OD.tolist(), duration.tolist(), distance.tolist())
+        ]
@@ -0,0 +1,299 @@
+import os
+import heapq
+import numpy as np
+import geopandas as gpd
+import osmnx as ox
+from shapely.ops import unary_union
+
+from modules.routing.osrm_client import extract_timestamp
+from modules.utils.spatial_index import GridIndex
+
+
+# In-process road-network router for runs without an OSRM server.
+# The osmnx drive graph of the simulation boundary is reduced to compact arrays (CSR
+# adjacency with per-edge length, travel time and geometry) and cached on disk as .npz,
+# so later runs need neither osmnx downloads nor a router. Queries snap coordinates to the
+# nearest graph node and run A* on travel time with ALT lower bounds (landmarks and the
+# triangle inequality). Results have the same shape as osrm_routing_machine.
+class GraphRouter:
+
+    ARRAYS = [
+        'node_lat', 'node_lon', 'indptr', 'tail', 'head', 'length', 'travel_time',
+        'geom_ptr', 'geom_lat', 'geom_lon', 'landmarks', 'from_landmark', 'to_landmark'
+    ]
+
+    def __init__(self, arrays, path=None):
+        self.path = path
+        for name in self.ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]))
+
+        self.index = GridIndex(self.node_lat, self.node_lon)
+
+        # Plain lists are much faster than numpy scalars inside the search loops
+        self._indptr = self.indptr.tolist()
+        self._tail = self.tail.tolist()
+        self._head = self.head.tolist()
+        self._length = self.length.tolist()
+        self._travel_time = self.travel_time.tolist()
+
+    # Load the cached router for the run, building and caching it on first use
+    @classmethod
+    def from_configs(cls, simul_configs):
+        region = simul_configs.get('relocation_region')
+        path = simul_configs.get('graph_cache_path') or f"data/etc/{region}_drive_graph.npz"
+        if os.path.exists(path):
+            return cls.load(path)
+
+        boundary_path = simul_configs.get('graph_boundary_path') or f"data/etc/{region}_boundary.geojson"
+        router = cls.from_boundary(boundary_path, n_landmarks=simul_configs.get('graph_landmarks', 16))
+        router.save(path)
+        return router
+
+    # Download the drive network inside a boundary file (same network as assign_osm_points)
+    @classmethod
+    def from_boundary(cls, boundary_path, n_landmarks=16):
+        region = gpd.read_file(boundary_path).to_crs(4326)
+        polygon = unary_union(region.geometry.values)
+
+        try:
+            G = ox.graph_from_polygon(polygon, network_type="drive", simplify=True)
+        except Exception as e:
+            raise RuntimeError(f"[OSM Error] Failed to load road network based on polygon: {e}")
+
+        # Keep every node reachable from every other, then add speeds and travel times
+        G = ox.truncate.largest_component(G, strongly=True)
+        G = ox.routing.add_edge_speeds(G)
+        G = ox.routing.add_edge_travel_times(G)
+        return cls.from_graph(G, n_landmarks)
+
+    # Build the router arrays from an osmnx graph (edge 'length' in m, 'travel_time' in s)
+    @classmethod
+    def from_graph(cls, G, n_landmarks=16):
+        nodes = list(G.nodes)
+        node_index = {node: idx for idx, node in enumerate(nodes)}
+        node_lat = np.array([G.nodes[node]['y'] for node in nodes], dtype=np.float64)
+        node_lon = np.array([G.nodes[node]['x'] for node in nodes], dtype=np.float64)
+
+        # Keep the fastest of parallel edges
+        edges = {}
+        for u, v, data in G.edges(data=True):
+            if u == v:
+                continue
+            key = (node_index[u], node_index[v])
+            if key not in edges or data['travel_time'] < edges[key]['travel_time']:
+                edges[key] = data
+
+        keys = sorted(edges)
+        tail = np.array([u for u, _ in keys], dtype=np.int64)
+        head = np.array([v for _, v in keys], dtype=np.int64)
+        length = np.array([edges[key]['length'] for key in keys], dtype=np.float64)
+        travel_time = np.array([edges[key]['travel_time'] for key in keys], dtype=np.float64)
+        indptr = np.searchsorted(tail, np.arange(len(nodes) + 1))
+
+        # Interior shape points of each edge (the end points are the nodes themselves)
+        geom_lon, geom_lat, geom_ptr = [], [], [0]
+        for key in keys:
+            geometry = edges[key].get('geometry')
+            coords = list(geometry.coords)[1:-1] if geometry is not None else []
+            geom_lon.extend(c[0] for c in coords)
+            geom_lat.extend(c[1] for c in coords)
+            geom_ptr.append(len(geom_lon))
+
+        arrays = {
+            'node_lat': node_lat, 'node_lon': node_lon, 'indptr': indptr, 'tail': tail, 'head': head,
+            'length': length, 'travel_time': travel_time, 'geom_ptr': np.array(geom_ptr, dtype=np.int64),
+            'geom_lat': np.array(geom_lat, dtype=np.float64), 'geom_lon': np.array(geom_lon, dtype=np.float64),
+        }
+        arrays.update(select_landmarks(indptr, tail, head, travel_time, n_landmarks))
+        return cls(arrays)
+
+    # Load a cached router: a compressed .npz file, or a directory of .npy files (save_mapped)
+    # whose arrays are memory-mapped read-only, so processes opening it share one copy
+    @classmethod
+    def load(cls, path):
+        if os.path.isdir(path):
+            return cls({name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in cls.ARRAYS}, path=path)
+        with np.load(path) as data:
+            return cls({name: data[name] for name in cls.ARRAYS}, path=path)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.ARRAYS})
+        self.path = path
+
+    # Save the arrays uncompressed as a directory of .npy files for memory-mapped loading
+    def save_mapped(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+
+    # Graph node closest to a coordinate
+    def nearest_node(self, lat, lon):
+        return self.index.nearest(lat, lon)
+
+    # Route between [lat, lon, lat, lon] in the osrm_routing_machine result format
+    # (geometry=False returns the end nodes and timestamps [0, duration], as request_route)
+    def route(self, OD_coords, geometry=True):
+        source = self.nearest_node(OD_coords[0], OD_coords[1])
+        target = self.nearest_node(OD_coords[2], OD_coords[3])
+        path = self.shortest_path(source, target)
+
+        duration = sum(self._travel_time[edge] for edge in path) / 60  # Convert to minutes
+        distance = sum(self._length[edge] for edge in path)
+        if not geometry:
+            route = [[self.node_lon[node].item(), self.node_lat[node].item()] for node in (source, target)]
+            timestamp = [0, duration if path else np.nan]
+        else:
+            route = [[self.node_lon[source].item(), self.node_lat[source].item()]]
+            for edge in path:
+                start, stop = self.geom_ptr[edge], self.geom_ptr[edge + 1]
+                route.extend(zip(self.geom_lon[start:stop].tolist(), self.geom_lat[start:stop].tolist()))
+                route.append([self.node_lon[self._head[edge]].item(), self.node_lat[self._head[edge]].item()])
+            route = [list(point) for point in route]
+            if len(route) == 1:
+                route.append(list(route[0]))
+            timestamp = extract_timestamp(route, duration)
+
+        result = {'route': route, 'timestamp': timestamp, 'duration': duration, 'distance': distance}
+
+        # Same edge case handling as osrm_routing_machine (zero-length route)
+        if np.isnan(result['timestamp'][-1]):
+            result['timestamp'][-1] = 0.01
+            result['duration'] = 0.01
+
+        return result
+
+    # Distance (m) and duration (min) matrices from sources to destinations ([[lat, lon], ...]),
+    # same format as osrm_table
+    def table(self, sources, destinations):
+        src_nodes = [self.nearest_node(lat, lon) for lat, lon in sources]
+        dst_nodes = [self.nearest_node(lat, lon) for lat, lon in destinations]
+        distance = np.full((len(src_nodes), len(dst_nodes)), np.nan)
+        duration = np.full((len(src_nodes), len(dst_nodes)), np.nan)
+
+        rows = {}
+        for i, source in enumerate(src_nodes):
+            if source not in rows:
+                rows[source] = self.one_to_many(source, set(dst_nodes))
+            times, meters = rows[source]
+            distance[i] = [meters.get(node, np.nan) for node in dst_nodes]
+            duration[i] = [times.get(node, np.nan) / 60 for node in dst_nodes]
+
+        return distance, duration
+
+    # Edge indices of the fastest path between two nodes (ALT A* search)
+    def shortest_path(self, source, target):
+        if source == target:
+            return []
+
+        # Landmark lower bounds on the travel time from every node to the target
+        bound = np.maximum(
+            (self.from_landmark[:, [target]] - self.from_landmark).max(axis=0),
+            (self.to_landmark - self.to_landmark[:, [target]]).max(axis=0)
+        )
+        bound = np.maximum(bound, 0).tolist()
+
+        indptr, head, travel_time = self._indptr, self._head, self._travel_time
+        best = {source: 0.0}
+        parent = {}
+        heap = [(bound[source], 0.0, source)]
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if cost > best[node]:
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                nxt = head[edge]
+                nxt_cost = cost + travel_time[edge]
+                if nxt_cost < best.get(nxt, np.inf):
+                    best[nxt] = nxt_cost
+                    parent[nxt] = edge
+                    heapq.heappush(heap, (nxt_cost + bound[nxt], nxt_cost, nxt))
+        else:
+            raise ValueError(f"No path between graph nodes {source} and {target}")
+
+        path = []
+        node = target
+        while node != source:
+            edge = parent[node]
+            path.append(edge)
+            node = self._tail[edge]
+        return path[::-1]
+
+    # Travel time (s) and length (m) of the fastest paths from source to the target nodes
+    def one_to_many(self, source, targets):
+        indptr, head, travel_time, length = self._indptr, self._head, self._travel_time, self._length
+        best, meters = {source: 0.0}, {source: 0.0}
+        remaining = set(targets)
+        settled = {}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            cost, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = cost
+            remaining.discard(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                nxt = head[edge]
+                nxt_cost = cost + travel_time[edge]
+                if nxt_cost < best.get(nxt, np.inf):
+                    best[nxt] = nxt_cost
+                    meters[nxt] = meters[node] + length[edge]
+                    heapq.heappush(heap, (nxt_cost, nxt))
+
+        return ({node: settled[node] for node in targets if node in settled},
+                {node: meters[node] for node in targets if node in settled})
+
+
+# Travel times (s) from source to every node over a CSR graph (inf when unreachable)
+def dijkstra_all(indptr, head, travel_time, source):
+    n = len(indptr) - 1
+    best = [np.inf] * n
+    best[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if cost > best[node]:
+            continue
+        for edge in range(indptr[node], indptr[node + 1]):
+            nxt = head[edge]
+            nxt_cost = cost + travel_time[edge]
+            if nxt_cost < best[nxt]:
+                best[nxt] = nxt_cost
+                heapq.heappush(heap, (nxt_cost, nxt))
+    return np.array(best)
+
+
+# Pick landmarks by farthest-point selection and precompute travel times from each landmark
+# to every node (from_landmark) and from every node to each landmark (to_landmark)
+def select_landmarks(indptr, tail, head, travel_time, n_landmarks):
+    n = len(indptr) - 1
+    n_landmarks = max(min(n_landmarks, n), 1)
+
+    # Reverse graph for the node -> landmark searches
+    order = np.argsort(head, kind='stable')
+    rev_indptr = np.searchsorted(head[order], np.arange(n + 1)).tolist()
+    rev_head = tail[order].tolist()
+    rev_travel_time = travel_time[order].tolist()
+    fwd = (indptr.tolist(), head.tolist(), travel_time.tolist())
+
+    # Start from the node farthest from node 0, then repeatedly add the node farthest
+    # from all chosen landmarks
+    landmarks = [int(np.argmax(dijkstra_all(*fwd, 0)))]
+    from_landmark, to_landmark = [], []
+    while True:
+        from_landmark.append(dijkstra_all(*fwd, landmarks[-1]))
+        to_landmark.append(dijkstra_all(rev_indptr, rev_head, rev_travel_time, landmarks[-1]))
+        if len(landmarks) == n_landmarks:
+            break
+
+        spread = np.min(np.array(from_landmark) + np.array(to_landmark), axis=0)
+        spread[landmarks] = -1
+        landmarks.append(int(np.argmax(spread)))
+
+    return {
+        'landmarks': np.array(landmarks, dtype=np.int64),
+        'from_landmark': np.array(from_landmark),
+        'to_landmark': np.array(to_landmark)
+    }
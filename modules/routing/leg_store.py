@@ -0,0 +1,145 @@
+import os
+import hashlib
+import numpy as np
+from tqdm import tqdm
+
+from modules.routing.osrm_client import route_many
+
+
+# Config keys the routed trip legs depend on (part of the default store path)
+TRIP_LEG_KEYS = ('routing_backend', 'osrm_url', 'graph_cache_path', 'detour_model_path', 'metrics_only')
+
+
+# Trip legs (ride -> alight routes) of every passenger, routed before the run and kept as
+# flat NumPy arrays in a directory of .npy files keyed by passenger ID. Route points and
+# timestamps of all legs are concatenated and addressed through an offset table (`ptr`),
+# so the store is opened memory-mapped and a lookup only reads the slices it needs.
+# The OD coordinates of each leg are stored too: a lookup whose coordinates differ
+# (a stale store) or whose leg could not be routed returns None, and the caller routes it.
+class TripLegStore:
+
+    ARRAYS = ['ids', 'od', 'ptr', 'route', 'timestamp', 'duration', 'distance']
+
+    def __init__(self, arrays, path=None):
+        self.path = path
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self.hits = 0     # legs served from the store
+        self.misses = 0   # legs the caller had to route
+
+    # Open the run's store (trip_leg_store_path, or default_path), routing every passenger's
+    # trip leg when the store is missing or does not cover the passengers
+    @classmethod
+    def from_configs(cls, simul_configs, passengers):
+        ids = passengers['ID'].values
+        OD = passengers[['ride_lat', 'ride_lon', 'alight_lat', 'alight_lon']].values
+        path = simul_configs.get('trip_leg_store_path') or cls.default_path(simul_configs, ids, OD)
+
+        if all(os.path.isfile(os.path.join(path, f'{name}.npy')) for name in cls.ARRAYS):
+            store = cls.load(path)
+            if store.covers(ids, OD):
+                return store
+
+        return cls.build(ids, OD, path, workers=simul_configs.get('routing_workers', 8),
+                         geometry=not simul_configs.get('metrics_only', False))
+
+    # Store directory shared by the runs of one scenario: data/etc/trip_legs/<relocation_region>_<key>,
+    # keyed by a hash of the passengers (IDs and OD) and the routing setup (TRIP_LEG_KEYS), so
+    # repeated runs reuse the legs and other scenarios never overwrite them
+    @staticmethod
+    def default_path(simul_configs, ids, OD):
+        digest = hashlib.sha1(repr([simul_configs.get(key) for key in TRIP_LEG_KEYS]).encode())
+        digest.update(np.asarray(ids).astype(str).tobytes())
+        digest.update(np.ascontiguousarray(OD, dtype=np.float64).tobytes())
+        return os.path.join('data', 'etc', 'trip_legs', f"{simul_configs.get('relocation_region')}_{digest.hexdigest()[:12]}")
+
+    # Route the trip legs of passenger IDs (OD rows [ride_lat, ride_lon, alight_lat, alight_lon])
+    # in batches of `batch_size` legs, save the store at path and open it memory-mapped
+    # (geometry=False stores duration and distance with two-point routes)
+    @classmethod
+    def build(cls, ids, OD, path, workers=8, batch_size=1000, geometry=True):
+        ids = np.asarray(ids)
+        if ids.dtype.kind == 'O':
+            ids = ids.astype(str)
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+
+        order = np.argsort(ids, kind='stable')
+        ids, OD = ids[order], OD[order]
+        if len(ids) > 1 and np.any(ids[1:] == ids[:-1]):
+            raise ValueError("Passenger IDs must be unique to build a trip leg store")
+
+        routes, timestamps = [], []
+        ptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        duration = np.full(len(ids), np.nan)
+        distance = np.full(len(ids), np.nan)
+        for start in tqdm(range(0, len(OD), batch_size), desc="trip legs", unit="batch"):
+            results = route_many(OD[start:start + batch_size].tolist(), workers, geometry)
+            for idx, result in enumerate(results, start):
+                if result is None:
+                    ptr[idx + 1] = ptr[idx]
+                    continue
+                routes.append(np.asarray(result['route'], dtype=np.float64).reshape(-1, 2))
+                timestamps.append(np.asarray(result['timestamp'], dtype=np.float64))
+                ptr[idx + 1] = ptr[idx] + len(timestamps[-1])
+                duration[idx], distance[idx] = result['duration'], result['distance']
+
+        arrays = {
+            'ids': ids, 'od': OD, 'ptr': ptr,
+            'route': np.concatenate(routes) if routes else np.empty((0, 2)),
+            'timestamp': np.concatenate(timestamps) if timestamps else np.empty(0),
+            'duration': duration, 'distance': distance
+        }
+        os.makedirs(path, exist_ok=True)
+        for name in cls.ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), arrays[name])
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        return cls({name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in cls.ARRAYS}, path=path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Store positions of passenger IDs and whether the stored OD matches (within 1e-7 degrees)
+    def locate(self, ids, OD):
+        ids = np.asarray(ids)
+        OD = np.asarray(OD, dtype=np.float64).reshape(-1, 4)
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+
+        if ids.dtype.kind == 'O':
+            ids = ids.astype(str)
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        found = (self.ids[pos] == ids) & np.all(np.abs(self.od[pos] - OD) <= 1e-7, axis=1)
+        return pos, found
+
+    # Whether every passenger's trip leg is stored
+    def covers(self, ids, OD):
+        return bool(np.all(self.locate(ids, OD)[1]))
+
+    # Stored trip legs for passenger IDs in the osrm_routing_machine result format
+    # (None for legs the caller has to route)
+    def lookup(self, ids, OD):
+        pos, found = self.locate(ids, OD)
+        results = []
+        for p, ok in zip(pos.tolist(), found.tolist()):
+            start, stop = (int(self.ptr[p]), int(self.ptr[p + 1])) if ok else (0, 0)
+            if start == stop:
+                results.append(None)
+                continue
+            results.append({
+                'route': self.route[start:stop].tolist(),
+                'timestamp': self.timestamp[start:stop].tolist(),
+                'duration': float(self.duration[p]),
+                'distance': float(self.distance[p])
+            })
+
+        served = sum(result is not None for result in results)
+        self.hits += served
+        self.misses += len(results) - served
+        return results
+
+    def stats(self):
+        return {'legs': len(self), 'hits': self.hits, 'misses': self.misses}
@@ -1,3 +1,7 @@
+import os
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import itertools
 import requests
@@ -10,14 +14,193 @@ from modules.utils.distance_utils import calculate_straight_distance
 
 warnings.filterwarnings('ignore')
 
-# Main OSRM routing function
-def osrm_routing_machine(OD_coords):
-    osrm_base, status = get_res(OD_coords)
+# change to the actual OSRM server
+DEFAULT_OSRM_URL = 'http://router.project-osrm.org'  # OSRM docker 없을때 사용
+# DEFAULT_OSRM_URL = 'http://127.0.0.1:8000'         # OSRM docker 있을때 사용
+
+
+# Persistent OSRM HTTP client. A single session keeps a keep-alive connection pool
+# (pool_size connections per host, enough for concurrent callers) that is reused by
+# every request instead of opening a new session and TCP connection per route.
+class OSRMClient:
+
+    def __init__(self, base_url=DEFAULT_OSRM_URL, profile='driving', timeout=(5, 30),
+                 max_retries=10, backoff_factor=1, pool_size=32, max_table_size=100):
+        self.base_url = base_url.rstrip('/')
+        self.profile = profile
+        self.max_table_size = max_table_size  # server's --max-table-size (locations per table request)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+
+    # Build a client from the simulation configs (osrm_* keys)
+    @classmethod
+    def from_configs(cls, simul_configs):
+        timeout = simul_configs.get('osrm_timeout', (5, 30))
+        return cls(
+            base_url=simul_configs.get('osrm_url', DEFAULT_OSRM_URL),
+            timeout=tuple(timeout) if isinstance(timeout, list) else timeout,
+            max_retries=simul_configs.get('osrm_max_retries', 10),
+            pool_size=simul_configs.get('osrm_pool_size', 32),
+            max_table_size=simul_configs.get('osrm_max_table_size', 100)
+        )
+
+    # Session for the current process (sockets are not shared with forked workers)
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            session = requests.Session()
+            retry = Retry(connect=self.max_retries, backoff_factor=self.backoff_factor)
+            adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session, self._pid = session, os.getpid()
+        return self._session
+
+    # GET an OSRM service (route, table, ...) for "lon,lat;lon,lat;..." coordinates
+    def get(self, service, coordinates, params=None):
+        url = f"{self.base_url}/{service}/v1/{self.profile}/{coordinates}"
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    # Route request between an origin and destination given as [lat, lon, lat, lon]
+    def route(self, point, overview='full'):
+        loc = f"{point[1]},{point[0]};{point[3]},{point[2]}"  # lon,lat;lon,lat format
+        return self.get('route', loc, params={'overview': overview})
+
+    # Table request between sources and destinations given as [[lat, lon], ...]
+    def table(self, sources, destinations):
+        coords = list(sources) + list(destinations)
+        loc = ';'.join(f"{lon},{lat}" for lat, lon in coords)
+        params = {
+            'sources': ';'.join(map(str, range(len(sources)))),
+            'destinations': ';'.join(map(str, range(len(sources), len(coords)))),
+            'annotations': 'distance,duration'
+        }
+        return self.get('table', loc, params=params)
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+# Module-level client shared by every routing call (replace it with set_osrm_client)
+_osrm_client = None
+
+
+# Return the shared OSRM client, creating a default one on first use
+def get_osrm_client():
+    global _osrm_client
+    if _osrm_client is None:
+        _osrm_client = OSRMClient()
+    return _osrm_client
+
+
+# Replace the shared OSRM client (e.g. OSRMClient.from_configs(simul_configs))
+def set_osrm_client(client):
+    global _osrm_client
+    if _osrm_client is not None and _osrm_client is not client:
+        _osrm_client.close()
+    _osrm_client = client
+    return client
+
+
+# In-process router (e.g. GraphRouter) answering route/table queries instead of the
+# OSRM server; None sends them to OSRM
+_offline_router = None
+
+
+def get_offline_router():
+    return _offline_router
+
+
+def set_offline_router(router):
+    global _offline_router
+    _offline_router = router
+    return router
+
+
+# Module-level route cache in front of osrm_routing_machine (None disables caching)
+_route_cache = None
+
+
+def get_route_cache():
+    return _route_cache
+
+
+# Replace the shared route cache (e.g. RouteCache.from_configs(simul_configs))
+def set_route_cache(cache):
+    global _route_cache
+    if _route_cache is not None and _route_cache is not cache:
+        _route_cache.close()
+    _route_cache = cache
+    return cache
+
+
+# Main OSRM routing function (served from the route cache when the OD pair was seen before).
+# geometry=False requests duration and distance only (see request_route)
+def osrm_routing_machine(OD_coords, client=None, geometry=True):
+    cache = _route_cache
+    if cache is None:
+        return request_route(OD_coords, client, geometry)
+
+    key = cache.key(OD_coords) if geometry else f'{cache.key(OD_coords)}:summary'
+    result = cache.get(key)
+    if result is None:
+        result = request_route(OD_coords, client, geometry)
+        if result is None:
+            return None
+        cache.put(key, result)
+
+    # Callers may replace fields (e.g. ETA-adjusted timestamps); the cached entry stays intact
+    return dict(result)
+
+
+# Thread pool shared by route_many calls (recreated when the worker count or process changes)
+_routing_pool = None
+_routing_pool_key = None
+_routing_pool_lock = threading.Lock()
+
+
+def get_routing_pool(max_workers):
+    global _routing_pool, _routing_pool_key
+    with _routing_pool_lock:
+        if _routing_pool_key != (max_workers, os.getpid()):
+            if _routing_pool is not None and _routing_pool_key[1] == os.getpid():
+                _routing_pool.shutdown(wait=False)
+            _routing_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='routing')
+            _routing_pool_key = (max_workers, os.getpid())
+        return _routing_pool
+
+
+# Route many OD pairs with at most max_workers requests in flight; results keep input order
+def route_many(OD_coords_list, max_workers=8, geometry=True):
+    route = osrm_routing_machine if geometry else partial(osrm_routing_machine, geometry=False)
+    if max_workers is None or max_workers <= 1 or len(OD_coords_list) <= 1:
+        return [route(od) for od in OD_coords_list]
+    return list(get_routing_pool(max_workers).map(route, OD_coords_list))
+
+
+# Route one OD pair on the OSRM server (or the offline router when one is set).
+# With geometry=False the server is asked for duration and distance only (overview=false):
+# no polyline is decoded and the route is the two snapped end points with timestamps [0, duration]
+def request_route(OD_coords, client=None, geometry=True):
+    if client is None and _offline_router is not None:
+        return _offline_router.route(OD_coords, geometry)
+
+    osrm_base, status = get_res(OD_coords, client, overview='full' if geometry else 'false')
     
     if status == 'defined':
         duration, distance = extract_duration_distance(osrm_base)
-        route = extract_route(osrm_base)
-        timestamp = extract_timestamp(route, duration)
+        if geometry:
+            route = extract_route(osrm_base)
+            timestamp = extract_timestamp(route, duration)
+        else:
+            route = extract_endpoints(osrm_base, OD_coords)
+            timestamp = [0, duration if duration > 0 else np.nan]
         
         result = {'route': route, 'timestamp': timestamp, 'duration': duration, 'distance': distance}
         
@@ -30,27 +213,20 @@ def osrm_routing_machine(OD_coords):
     else: 
         return None
 
+
+# Two-point summary (end points and timestamps [0, duration]) of a routing result, the
+# same shape as a geometry=False route
+def summarize_route(result):
+    return dict(result, route=[result['route'][0], result['route'][-1]], timestamp=[0, result['timestamp'][-1]])
+
         
 # Get routing response from OSRM server
-def get_res(point):
+def get_res(point, client=None, overview='full'):
     status = 'defined'
 
-    # Setup session with retry strategy
-    session = requests.Session()
-    retry = Retry(connect=10, backoff_factor=1)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-
-    # Build OSRM request URL
-    overview = '?overview=full'
-    loc = f"{point[1]},{point[0]};{point[3]},{point[2]}"  # lon,lat;lon,lat format
-    # change to the actual OSRM server
-    url = 'http://router.project-osrm.org/route/v1/driving/' # OSRM docker 없을때 사용
-
-    # url = "http://127.0.0.1:8000/route/v1/driving/" # OSRM docker 있을때 사용
-    
-    r = session.get(url + loc + overview) 
+    # Reuse the pooled client's connections
+    client = get_osrm_client() if client is None else client
+    r = client.route(point, overview)
     
     # Handle failed requests with fallback calculation
     if r.status_code != 200:
@@ -76,6 +252,52 @@ def get_res(point):
     return res, status
 
 
+# Distance (m) and duration (min) matrices from sources to destinations ([[lat, lon], ...])
+# via the OSRM table service. Large matrices are split into blocks that respect the
+# server's table size limit; cells OSRM could not answer (including blocks whose request
+# failed) are left as NaN for the caller's straight-line fallback.
+def osrm_table(sources, destinations, client=None):
+    if client is None and _offline_router is not None:
+        return _offline_router.table(sources, destinations)
+
+    client = get_osrm_client() if client is None else client
+    n_src, n_dst = len(sources), len(destinations)
+    distance = np.full((n_src, n_dst), np.nan)
+    duration = np.full((n_src, n_dst), np.nan)
+    if n_src == 0 or n_dst == 0:
+        return distance, duration
+
+    # Block sizes with src_block + dst_block <= max_table_size
+    max_size = max(client.max_table_size, 2)
+    src_block = min(n_src, max(max_size - n_dst, max_size // 2))
+    dst_block = max_size - src_block
+
+    failed, error = 0, None
+    for i in range(0, n_src, src_block):
+        for j in range(0, n_dst, dst_block):
+            # Unreachable server, timeouts and malformed responses leave the block NaN
+            try:
+                r = client.table(sources[i:i + src_block], destinations[j:j + dst_block])
+                if r.status_code != 200:
+                    continue
+                res = r.json()
+            except requests.RequestException as e:
+                failed, error = failed + 1, e
+                continue
+            if res.get('code') != 'Ok':
+                continue
+
+            block = (slice(i, i + src_block), slice(j, j + dst_block))
+            distance[block] = np.array(res['distances'], dtype=np.float64)
+            duration[block] = np.array(res['durations'], dtype=np.float64) / 60  # Convert to minutes
+
+    if failed > 0:
+        blocks = -(-n_src // src_block) * -(-n_dst // dst_block)
+        print(f"- OSRM table: {failed}/{blocks} block requests failed ({type(error).__name__}); "
+              f"their cells fall back to straight-line distances")
+    return distance, duration
+
+
 # Extract duration and distance from OSRM response
 def extract_duration_distance(res):
     duration = res['routes'][0]['duration'] / 60  # Convert to minutes
@@ -90,6 +312,15 @@ def extract_route(res):
     return route
 
 
+# Snapped origin and destination ([lon, lat]) of an OSRM response (the requested
+# coordinates when the response has no waypoints)
+def extract_endpoints(res, OD_coords):
+    waypoints = res.get('waypoints') or []
+    if len(waypoints) >= 2:
+        return [list(map(float, waypoints[0]['location'])), list(map(float, waypoints[-1]['location']))]
+    return [[float(OD_coords[1]), float(OD_coords[0])], [float(OD_coords[3]), float(OD_coords[2])]]
+
+
 # Calculate timestamp for each route point based on distance
 def extract_timestamp(route, duration):
     rt = np.array(route)
@@ -0,0 +1,130 @@
+import os
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+# Two-tier cache of routing results ({route, timestamp, duration, distance}) keyed by the
+# origin/destination coordinates rounded to `precision` decimals (5 decimals ~ 1 m).
+# Tier 1 is an in-memory LRU holding up to `maxsize` routes; tier 2 is an optional SQLite
+# file shared across runs, so repeated scenarios only route new OD pairs. `namespace`
+# separates routes from different routers (e.g. OSRM servers) in the same file.
+class RouteCache:
+
+    def __init__(self, maxsize=10000, precision=6, path=None, namespace='osrm', commit_every=256):
+        self.maxsize = maxsize
+        self.precision = precision
+        self.path = path
+        self.namespace = namespace
+        self.commit_every = commit_every
+
+        self._routes = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._pending = 0
+
+        self.hits = 0         # served from memory
+        self.disk_hits = 0    # served from the SQLite store
+        self.misses = 0       # had to be routed
+        self.evictions = 0    # dropped from memory by the LRU
+
+    # Build a cache from the simulation configs (route_cache_* keys); None when disabled
+    @classmethod
+    def from_configs(cls, simul_configs, namespace='osrm'):
+        maxsize = simul_configs.get('route_cache_size', 10000)
+        if not maxsize:
+            return None
+        return cls(
+            maxsize=maxsize,
+            precision=simul_configs.get('route_cache_precision', 6),
+            path=simul_configs.get('route_cache_path'),
+            namespace=namespace
+        )
+
+    # Quantized cache key of [lat, lon, lat, lon] coordinates
+    def key(self, OD_coords):
+        return ','.join(f'{float(c):.{self.precision}f}' for c in OD_coords)
+
+    # Cached route for the key, or None
+    def get(self, key):
+        with self._lock:
+            result = self._routes.get(key)
+            if result is not None:
+                self._routes.move_to_end(key)
+                self.hits += 1
+                return result
+
+            db = self._connection()
+            if db is not None:
+                row = db.execute(
+                    'SELECT result FROM routes WHERE namespace = ? AND key = ?', (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.disk_hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    # Store a route in memory (and on disk when a store is configured)
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, result)
+
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    'INSERT OR REPLACE INTO routes (namespace, key, result) VALUES (?, ?, ?)',
+                    (self.namespace, key, json.dumps(result))
+                )
+                self._pending += 1
+                if self._pending >= self.commit_every:
+                    db.commit()
+                    self._pending = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+            'evictions': self.evictions, 'size': len(self._routes)
+        }
+
+    # Commit pending writes to the SQLite store
+    def flush(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.commit()
+                self._pending = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+
+    # Insert into the LRU, evicting the least recently used routes beyond maxsize
+    def _remember(self, key, result):
+        self._routes[key] = result
+        self._routes.move_to_end(key)
+        while len(self._routes) > self.maxsize:
+            self._routes.popitem(last=False)
+            self.evictions += 1
+
+    # SQLite connection for the current process (connections are not shared across forks)
+    def _connection(self):
+        if self.path is None:
+            return None
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS routes '
+                '(namespace TEXT, key TEXT, result TEXT, PRIMARY KEY (namespace, key))'
+            )
+            self._db, self._pid, self._pending = db, os.getpid(), 0
+        return self._db
@@ -26,6 +26,31 @@ def calculate_straight_distance(lat1, lon1, lat2, lon2):
     return km
 
 
+# Haversine distance matrix (km) from every point of A to every point of B ([[lat, lon], ...]).
+# Same formula as calculate_straight_distance, broadcast over row blocks of about `block_size`
+# cells so temporaries stay bounded; dtype=np.float32 halves memory for large matrices.
+def haversine_matrix(A, B, dtype=np.float64, block_size=1 << 20):
+    dtype = np.dtype(dtype)
+    A = np.deg2rad(np.asarray(A, dtype=np.float64).reshape(-1, 2)).astype(dtype, copy=False)
+    B = np.deg2rad(np.asarray(B, dtype=np.float64).reshape(-1, 2)).astype(dtype, copy=False)
+    km_constant = dtype.type(3959 * 1.609344)
+
+    lat1, lon1 = A[:, 0:1], A[:, 1:2]
+    lat2, lon2 = B[:, 0], B[:, 1]
+    cos_lat1, cos_lat2 = np.cos(lat1), np.cos(lat2)
+
+    km = np.empty((len(A), len(B)), dtype=dtype)
+    rows = max(block_size // max(len(B), 1), 1)
+    for start in range(0, len(A), rows):
+        block = slice(start, start + rows)
+        a = np.sin((lat2 - lat1[block]) / 2) ** 2
+        a += cos_lat1[block] * cos_lat2 * np.sin((lon2 - lon1[block]) / 2) ** 2
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        km[block] = km_constant * (2 * a)
+    return km
+
+
 # Calculate total distance for routes (returns km)
 def calculate_route_distance(data):
     distance = []
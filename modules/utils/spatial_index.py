@@ -0,0 +1,184 @@
+import numpy as np
+
+from modules.utils.distance_utils import haversine_matrix
+
+
+# Uniform grid over lat/lon points for nearest-point lookups without a KD-tree library.
+# Points are bucketed into square cells of `cell_deg` degrees of latitude in a local
+# equirectangular projection (longitudes scaled by cos(mean latitude)), sorted by cell
+# and addressed through a cell -> (start, stop) slice table.
+class GridIndex:
+
+    def __init__(self, lat, lon, cell_deg=0.005):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self.lon_scale = np.cos(np.deg2rad(np.mean(self.lat))) if len(self.lat) > 0 else 1.0
+
+        x, y = self._project(self.lat, self.lon)
+        cx, cy = self._cell(x, y)
+        order = np.lexsort((cy, cx))
+        self._order = order
+        self._x, self._y = x[order], y[order]
+
+        # Slice of the sorted points for every occupied cell
+        keys = np.stack([cx[order], cy[order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)]) if len(order) > 0 else []
+        stops = np.r_[starts[1:], len(order)] if len(order) > 0 else []
+        self._cells = {
+            (int(keys[s, 0]), int(keys[s, 1])): (int(s), int(e)) for s, e in zip(starts, stops)
+        }
+        if self._cells:
+            cells = np.array(list(self._cells))
+            self._bounds = cells.min(axis=0), cells.max(axis=0)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _project(self, lat, lon):
+        return np.asarray(lon, dtype=np.float64) * self.lon_scale, np.asarray(lat, dtype=np.float64)
+
+    def _cell(self, x, y):
+        return np.floor(x / self.cell_deg).astype(np.int64), np.floor(y / self.cell_deg).astype(np.int64)
+
+    # Index of the point closest to (lat, lon) in the projected plane
+    def nearest(self, lat, lon):
+        if not self._cells:
+            raise ValueError("GridIndex is empty")
+
+        qx, qy = self._project(lat, lon)
+        cx, cy = (int(c) for c in self._cell(qx, qy))
+        best, best_dist = -1, np.inf
+
+        # Scan square rings of cells until no unscanned cell can hold a closer point
+        low, high = self._bounds
+        max_ring = max(cx - low[0], high[0] - cx, cy - low[1], high[1] - cy, 0)
+        for ring in range(max_ring + 1):
+            for i in range(cx - ring, cx + ring + 1):
+                step = 1 if abs(i - cx) == ring else 2 * ring
+                for j in range(cy - ring, cy + ring + 1, max(step, 1)):
+                    span = self._cells.get((i, j))
+                    if span is None:
+                        continue
+                    start, stop = span
+                    dist = (self._x[start:stop] - qx) ** 2 + (self._y[start:stop] - qy) ** 2
+                    k = int(np.argmin(dist))
+                    if dist[k] < best_dist:
+                        best, best_dist = start + k, dist[k]
+
+            if best >= 0 and np.sqrt(best_dist) <= ring * self.cell_deg:
+                break
+
+        return int(self._order[best])
+
+    # Nearest point index for every (lat, lon) pair
+    def nearest_many(self, lat, lon):
+        return np.array([self.nearest(a, b) for a, b in zip(np.ravel(lat), np.ravel(lon))], dtype=np.int64)
+
+
+# GridIndex over points that can be removed, answering exact great-circle nearest queries.
+# Candidates from the rings of cells around the query are measured with haversine_matrix
+# (the same values as a full cost row), ties go to the lowest point index, and the ring search
+# stops once a lower bound on the distance to every unscanned cell exceeds the best match.
+# `cell_deg` defaults to a size holding about two points per cell.
+class HaversineGridIndex(GridIndex):
+
+    def __init__(self, lat, lon, cell_deg=None, dtype=np.float64):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if cell_deg is None:
+            cell_deg = 0.005
+            if len(lat) > 0:
+                width = np.ptp(lon) * np.cos(np.deg2rad(np.mean(lat)))
+                cell_deg = max(np.sqrt(max(width * np.ptp(lat), 1e-8) * 2 / len(lat)), 1e-4)
+        super().__init__(lat, lon, cell_deg)
+
+        self.dtype = np.dtype(dtype)
+        self._points = np.stack([self.lat, self.lon], axis=1)
+        self._alive = np.ones(len(self.lat), dtype=bool)
+        self._size = len(self.lat)
+        self._cos_min = np.cos(np.deg2rad(np.abs(self.lat).max())) if len(self.lat) > 0 else 1.0
+
+    def __len__(self):
+        return self._size
+
+    # Drop a point from later queries
+    def remove(self, idx):
+        if self._alive[idx]:
+            self._alive[idx] = False
+            self._size -= 1
+
+    # Index of the remaining point closest to (lat, lon) and its haversine distance (km)
+    def nearest_haversine(self, lat, lon):
+        if self._size == 0:
+            raise ValueError("HaversineGridIndex is empty")
+
+        indices, distances = self.nearest_k(lat, lon, k=1)
+        return int(indices[0]), distances[0]
+
+    # Up to k remaining points closest to (lat, lon) within `radius` km, as (indices, km)
+    # sorted by distance with ties by index
+    def nearest_k(self, lat, lon, k=1, radius=np.inf):
+        k = min(k, self._size)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype)
+
+        qx, qy = self._project(lat, lon)
+        cx, cy = (int(c) for c in self._cell(qx, qy))
+        cos_q = np.cos(np.deg2rad(lat))
+        km_constant = 3959 * 1.609344
+        found_idx, found_dist = [], []
+        found, kth = 0, np.inf
+
+        low, high = self._bounds
+        max_ring = max(cx - low[0], high[0] - cx, cy - low[1], high[1] - cy, 0)
+        for ring in range(max_ring + 1):
+            # Past this ring size the rings are mostly empty cells (few points left, or a
+            # query far from them), so measure every remaining point instead
+            if 8 * ring > len(self._cells):
+                candidates = np.flatnonzero(self._alive)
+                dist = haversine_matrix([[lat, lon]], self._points[candidates], self.dtype)[0]
+                keep = dist <= radius
+                found_idx, found_dist = [candidates[keep]], [dist[keep]]
+                found = int(keep.sum())
+                break
+
+            spans = []
+            for i in range(cx - ring, cx + ring + 1):
+                step = 1 if abs(i - cx) == ring else 2 * ring
+                for j in range(cy - ring, cy + ring + 1, max(step, 1)):
+                    span = self._cells.get((i, j))
+                    if span is not None:
+                        spans.append(self._order[span[0]:span[1]])
+
+            if spans:
+                candidates = np.concatenate(spans)
+                candidates = candidates[self._alive[candidates]]
+                if len(candidates) > 0:
+                    dist = haversine_matrix([[lat, lon]], self._points[candidates], self.dtype)[0]
+                    keep = dist <= radius
+                    found_idx.append(candidates[keep])
+                    found_dist.append(dist[keep])
+                    found += int(keep.sum())
+                    if found >= k:
+                        kth = np.partition(np.concatenate(found_dist), k - 1)[k - 1]
+
+            limit = min(kth, radius)
+            if limit == np.inf:
+                continue
+
+            # Unscanned points lie beyond the ring in latitude or in (scaled) longitude
+            lat_gap = min(qy - (cy - ring) * self.cell_deg, (cy + ring + 1) * self.cell_deg - qy)
+            lon_gap = min(qx - (cx - ring) * self.cell_deg, (cx + ring + 1) * self.cell_deg - qx) / self.lon_scale
+            lat_bound = km_constant * np.deg2rad(lat_gap)
+            lon_bound = 2 * km_constant * np.arcsin(min(
+                np.sqrt(cos_q * self._cos_min) * np.sin(np.deg2rad(min(lon_gap, 180)) / 2), 1.0
+            ))
+            if min(lat_bound, lon_bound) * (1 - 1e-6) > limit:
+                break
+
+        if found == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype)
+        indices, distances = np.concatenate(found_idx), np.concatenate(found_dist)
+        order = np.lexsort((indices, distances))[:k]
+        return indices[order], distances[order]
@@ -0,0 +1,110 @@
+"""
+Seongnam TAXI Simulation - Scenario Sweep Script
+대한민국 경기도 성남시 택시 시뮬레이션 시나리오 스윕 실행 스크립트
+
+Runs every combination of the configuration grid below (once per random seed)
+across a process pool. Input data is preprocessed once; each run gets its own
+result folder and one summary table is written for the whole sweep.
+아래 설정 그리드의 모든 조합을 (시드별로) 프로세스 풀에서 병렬 실행합니다.
+입력 데이터는 한 번만 전처리되며, 실행마다 별도의 결과 폴더가 생성되고
+스윕 전체의 요약 테이블이 저장됩니다.
+"""
+
+# =========== External Library Imports ===========
+
+import os
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+import time
+import warnings
+
+warnings.filterwarnings('ignore')
+
+# =========== Internal Module Imports ===========
+
+from modules.engine.config_manager import base_configs
+from modules.engine.sweep_runner import expand_grid, fleet_key, run_sweep
+from modules.preprocess.passenger_preprocessor import preprocess_passengers
+from modules.preprocess.vehicle_preprocessor import preprocess_vehicles
+
+# =========== CONFIGURATION ===========
+
+RAW_DATA_PATH = "data/etc/Seongnam_Taxi_20240418.csv"
+BOUNDARY_PATH = "data/etc/seongnam_boundary.geojson"
+
+BASE_DATE = "2024-04-18"
+TIME_RANGE_START = 1080
+TIME_RANGE_END   = 1260
+
+# Scenario grid: every combination of the values below is run once per seed.
+# 'num_taxis' / 'use_shift' select the fleet, other keys override base_configs.
+SWEEP_GRID = {
+    'num_taxis': [750, 950],
+    'use_shift': [True],
+    'dispatch_mode': ['in_order', 'optimization'],
+    'matrix_mode': ['haversine_distance']
+}
+SEEDS = [42, 43, 44]  # 난수 시드 (택시 초기 위치 재현성 제어)
+
+SWEEP_WORKERS = 4     # 동시에 실행할 시뮬레이션 프로세스 수
+SWEEP_NAME = None     # 결과 폴더 이름 (None = sweep_<날짜_시간>)
+
+print("=" * 40)
+print("    Seongnam Taxi Simulation Sweep")
+print("=" * 40)
+
+# =========== SHARED INPUTS (preprocessed once) ===========
+
+passengers, sgn_union = preprocess_passengers(
+    raw_data_path=RAW_DATA_PATH,
+    boundary_path=BOUNDARY_PATH,
+    base_date=BASE_DATE,
+    start_min=TIME_RANGE_START,
+    end_min=TIME_RANGE_END,
+    output_dir="./data/agents"
+)
+
+scenarios = expand_grid(SWEEP_GRID, SEEDS)
+
+# One fleet per distinct (num_taxis, use_shift, seed), shared by the runs that use it
+fleets = {}
+for scenario in scenarios:
+    key = fleet_key(scenario)
+    if key not in fleets:
+        fleets[key] = preprocess_vehicles(
+            sgn_union=sgn_union,
+            n_total=scenario['num_taxis'],
+            start_min=TIME_RANGE_START,
+            end_min=TIME_RANGE_END,
+            use_shift=scenario['use_shift'],
+            seed=scenario['seed'],
+            output_dir="./data/agents"
+        )
+
+# =========== CONFIGURATION ===========
+# simulation configuration   (base_configs is in modules/engine/config_manager.py)
+
+base_configs['target_region'] = 'Seongnam, South Korea'
+base_configs['base_date'] = BASE_DATE
+base_configs['relocation_region'] = 'seongnam'
+base_configs['additional_path'] = 'scenario_sweep'
+base_configs['dispatch_mode'] = 'in_order'
+base_configs['time_range'] = [TIME_RANGE_START, TIME_RANGE_END]
+base_configs['matrix_mode'] = 'haversine_distance'
+base_configs['add_board_time'] = 0.2
+base_configs['add_disembark_time'] = 0.2
+
+simul_configs = base_configs
+
+print("\n[CONFIG]")
+print(f"- Runs: {len(scenarios)} ({len(fleets)} fleets)")
+print(f"- Time Range: {TIME_RANGE_START//60:02d}:00 ~ {TIME_RANGE_END//60:02d}:00")
+
+# =========== SWEEP ===========
+
+start_time = time.time()
+summary = run_sweep(scenarios, passengers, fleets, simul_configs, workers=SWEEP_WORKERS, sweep_name=SWEEP_NAME)
+
+print("\n[RESULT]")
+print(summary.reindex(columns=['run', *SWEEP_GRID, 'seed', 'status', 'served', 'fail_rate', 'mean_wait']).to_string(index=False))
+print(f"→ Elapsed: {time.time() - start_time:.1f} s")
+print("=" * 40)